@@ -1,5 +1,6 @@
 from flask import Flask, render_template, request, jsonify
 from flask import Response
+from markupsafe import Markup
 import threading
 import subprocess
 import sys
@@ -10,8 +11,41 @@ from datetime import datetime, timezone
 import uuid
 import time
 
+from azure.core.exceptions import ResourceNotFoundError
 from azure.storage.blob import BlobServiceClient as SyncBlobServiceClient
 
+from chunk_store import is_chunk_blob, logical_size, open_blob_stream
+from report_view import get_report_cache, page_etag, page_headers, render_report
+from research_inputs import cleanup_inputs, max_upload_bytes
+from research_runs import (
+    SCRIPT_PATH,
+    admit_run,
+    current_user,
+    get_research_python,
+    get_storage_connection_string,
+    is_expired,
+    log_header,
+    new_log_path,
+    new_run_entry,
+    public_entry,
+    publish_run,
+    readmit_queued_run,
+    register_run,
+    release_usage,
+    remote_log_range,
+    remote_status,
+    remove_run_files,
+    researcher_command,
+    researcher_env,
+    save_run_attachments,
+    settle_usage,
+    takeover_entry,
+    usage_path_for,
+)
+from research_search import get_search_index, iter_decoded
+from run_coordination import get_run_coordinator
+from usage_accounting import get_usage_ledger
+
 # Configure logging for Azure App Service
 logging.basicConfig(
     level=logging.INFO,
@@ -23,76 +57,106 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__, template_folder="templates")
+# /start accepts multi-megabyte supporting documents; werkzeug spools large uploads to disk
+app.config["MAX_CONTENT_LENGTH"] = max_upload_bytes()
 
 # Globals to track multiple concurrent runs
 run_lock = threading.Lock()
 runs = {}  # mapping: run_id -> { thread, process, start, end, returncode, log, status }
 
+# Shared run records/logs in blob storage so any scaled-out instance can serve any run (None when disabled)
+coordinator = get_run_coordinator()
 
-def get_research_python() -> str:
-    """Return a Python executable path to run the researcher script.
 
-    Priority:
-    1. RESEARCH_PYTHON env var (if exists)
-    2. sys.executable (Azure App Service)
-    3. Infer from installed azure.ai.agents module location
+def _wait_with_heartbeat(proc, ownership, log_path: Path) -> int:
+    """Wait for the researcher process, renewing the run's ownership lease while it runs."""
+    if ownership is None:
+        return proc.wait()
+    interval = int(os.getenv("RUN_HEARTBEAT_SECONDS", "15"))
+    while True:
+        try:
+            return proc.wait(timeout=interval)
+        except subprocess.TimeoutExpired:
+            if not ownership.heartbeat(log_path):
+                # another instance may already be running this research; stop our copy
+                logger.error(f"Lost ownership of run {ownership.run_id}, stopping researcher process")
+                proc.kill()
+                return proc.wait()
+
+
+def _wait_for_admission(run_id: str, user: str, ownership) -> None:
+    """Hold a queued run until the usage budget admits it (no-op once budget is reserved)."""
+    interval = int(os.getenv("USAGE_QUEUE_POLL_SECONDS", "15"))
+    while True:
+        reason = readmit_queued_run(run_id, user)
+        with run_lock:
+            if reason is None:
+                runs[run_id].pop("queued_reason", None)
+                return
+            runs[run_id]["queued_reason"] = reason
+        # keep the ownership lease alive while waiting so the run is not taken over
+        if ownership is not None and not ownership.heartbeat():
+            raise RuntimeError("lost ownership of the run while waiting for usage budget")
+        time.sleep(interval)
+
+
+def _send_prompt(proc, research_content: str) -> None:
+    """Hand the research prompt to the researcher on stdin and close it."""
+    try:
+        proc.stdin.write((research_content or "").encode("utf-8"))
+    except BrokenPipeError:
+        # the researcher exited before reading its prompt; its log explains why
+        pass
+    finally:
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:
+            pass
+
+
+def run_research_script(run_id: str, script_path: Path, log_path: Path, research_content: str = None, ownership=None, attachments=None) -> None:
+    """Start the deep research script for a specific run_id and update runs metadata.
+
+    The prompt is passed on stdin rather than argv (no ARG_MAX limit, not visible in
+    process listings); attachments are file paths the researcher uploads to the agent.
+
+    When ownership (a run_coordination.RunOwnership) is given, the run's lease is renewed
+    and its record and log are published to blob storage while the process runs.
     """
-    # 1) explicit env override
-    env_path = os.getenv("RESEARCH_PYTHON")
-    if env_path:
-        p = Path(env_path)
-        if p.exists():
-            logger.info(f"Using RESEARCH_PYTHON: {env_path}")
-            return str(p)
-
-    # 2) Use sys.executable (works best in Azure App Service)
-    python_exe = sys.executable
-    logger.info(f"Using sys.executable: {python_exe}")
-    return python_exe
-
-
-def run_research_script(run_id: str, script_path: Path, log_path: Path, research_content: str = None) -> None:
-    """Start the deep research script for a specific run_id and update runs metadata."""
     logger.info(f"Starting research script for run_id: {run_id}")
     logger.info(f"Script path: {script_path}")
     logger.info(f"Log path: {log_path}")
     logger.info(f"Research content length: {len(research_content) if research_content else 0}")
     
+    with run_lock:
+        user = runs[run_id].get("user") or "anonymous"
+    usage_path = usage_path_for(log_path)
+
     try:
+        _wait_for_admission(run_id, user, ownership)
+
         with run_lock:
             runs[run_id]["start"] = datetime.now(timezone.utc).isoformat()
             runs[run_id]["end"] = None
             runs[run_id]["returncode"] = None
             runs[run_id]["status"] = "running"
+            started = runs[run_id]["start"]
+        publish_run(ownership, log_path, status="running", start=started, end=None, returncode=None)
 
         # Ensure log directory exists
         log_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        # Write initial log entry
-        with open(log_path, "w", encoding="utf-8") as log_fp:
-            log_fp.write(f"Starting research run {run_id} at {datetime.now(timezone.utc).isoformat()}\n")
-            log_fp.write(f"Python executable: {get_research_python()}\n")
-            log_fp.write(f"Script path: {script_path}\n")
-            log_fp.write(f"Working directory: {script_path.parent}\n")
-            log_fp.write(f"Research content length: {len(research_content) if research_content else 0}\n")
-            log_fp.write("=" * 80 + "\n")
-            log_fp.flush()
+        python_exe = get_research_python()
+        log_path.write_text(log_header(run_id, python_exe, script_path, research_content, attachments), encoding="utf-8")
 
         with open(log_path, "ab") as log_fp:
-            python_exe = get_research_python()
-            env = os.environ.copy()
-            env["PYTHONUNBUFFERED"] = "1"
-            env["PYTHONIOENCODING"] = "utf-8"
-
-            # Build command with research content as argument if provided
-            cmd = [python_exe, "-u", str(script_path)]
-            if research_content:
-                cmd.append(research_content)
-            
-            logger.info(f"Running command: {' '.join(cmd[:2])} [content]")
+            cmd = researcher_command(python_exe, script_path, attachments)
+            env = researcher_env(usage_path)
+
+            logger.info(f"Running command: {' '.join(cmd)}")
 
             proc = subprocess.Popen(
                 cmd,
+                stdin=subprocess.PIPE,
                 stdout=log_fp,
                 stderr=subprocess.STDOUT,
                 cwd=str(script_path.parent),
@@ -103,14 +167,21 @@ def run_research_script(run_id: str, script_path: Path, log_path: Path, research
             with run_lock:
                 runs[run_id]["process"] = proc
 
-            returncode = proc.wait()
+            _send_prompt(proc, research_content)
+            returncode = _wait_with_heartbeat(proc, ownership, log_path)
             logger.info(f"Process finished with return code: {returncode}")
 
+        usage = settle_usage(run_id, user, usage_path)
+
         with run_lock:
             runs[run_id]["end"] = datetime.now(timezone.utc).isoformat()
             runs[run_id]["returncode"] = returncode
             runs[run_id]["status"] = "completed" if returncode == 0 else "failed"
-            
+            runs[run_id]["usage"] = usage
+            final_fields = {k: runs[run_id][k] for k in ("status", "end", "returncode", "usage")}
+        publish_run(ownership, log_path, final=True, **final_fields)
+        cleanup_inputs(run_id)
+
     except Exception as ex:
         logger.error(f"Exception in run_research_script: {ex}", exc_info=True)
         # record failure in the run metadata and write the exception to the log
@@ -120,22 +191,20 @@ def run_research_script(run_id: str, script_path: Path, log_path: Path, research
                 log_fp.write(error_msg.encode("utf-8", errors="replace"))
         except Exception as log_ex:
             logger.error(f"Failed to write error to log: {log_ex}")
+        release_usage(run_id)
         with run_lock:
             runs[run_id]["end"] = datetime.now(timezone.utc).isoformat()
             runs[run_id]["returncode"] = -1
             runs[run_id]["status"] = "failed"
+            final_fields = {k: runs[run_id][k] for k in ("status", "end", "returncode")}
+        publish_run(ownership, log_path, final=True, **final_fields)
+        cleanup_inputs(run_id)
 
 
 def _get_sync_blob_service_client():
-    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
-    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
-    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
-
+    conn_str = get_storage_connection_string()
     if not conn_str:
-        if account_name and account_key:
-            conn_str = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
-        else:
-            return None
+        return None
     try:
         return SyncBlobServiceClient.from_connection_string(conn_str)
     except Exception:
@@ -155,57 +224,82 @@ def start():
     # Create a unique run id, prepare a per-run log file, and start the researcher in a background thread
     logger.info("Received start request")
     
-    script_path = Path(__file__).resolve().parent / "split_deepresearcher_to_blob.py"
-    logger.info(f"Script path: {script_path}")
-    logger.info(f"Script exists: {script_path.exists()}")
+    logger.info(f"Script path: {SCRIPT_PATH}")
+    logger.info(f"Script exists: {SCRIPT_PATH.exists()}")
     
-    if not script_path.exists():
-        logger.error(f"Script not found: {script_path}")
-        return jsonify({"status": "missing_script", "detail": str(script_path)}), 500
+    if not SCRIPT_PATH.exists():
+        logger.error(f"Script not found: {SCRIPT_PATH}")
+        return jsonify({"status": "missing_script", "detail": str(SCRIPT_PATH)}), 500
 
-    # Get research content from JSON payload
+    # Get research content from a JSON payload, or from a multipart form carrying attachments
     research_content = None
+    uploads = []
     if request.is_json:
         data = request.get_json()
         research_content = data.get('research_content', '').strip() if data else None
-        logger.info(f"Received research content: {len(research_content) if research_content else 0} characters")
+    elif request.mimetype == 'multipart/form-data':
+        research_content = request.form.get('research_content', '').strip()
+        uploads = [f for f in request.files.getlist('attachments') if f and f.filename]
+    logger.info(f"Received research content: {len(research_content) if research_content else 0} characters, {len(uploads)} attachments")
     
     if not research_content:
         logger.warning("No research content provided")
         return jsonify({"status": "missing_content", "detail": "Research content is required"}), 400
 
-    # Use a more reliable temp directory for Azure App Service
-    logs_dir = Path(os.getenv('TEMP', '/tmp')) / 'research_logs'
-    logs_dir.mkdir(parents=True, exist_ok=True)
-    logger.info(f"Logs directory: {logs_dir}")
-
     run_id = uuid.uuid4().hex
-    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-    log_path = logs_dir / f"{run_id}_{timestamp}.log"
+    log_path = new_log_path(run_id)
     logger.info(f"Log file: {log_path}")
 
+    # Admission: reserve usage budget for the run, or reject/queue it when a budget would be exceeded
+    user = current_user(request.headers)
+    try:
+        queued_reason, rejected = admit_run(run_id, user)
+    except Exception as ex:
+        return jsonify({"status": "admission_unavailable", "detail": str(ex)}), 503
+    if rejected:
+        return jsonify({"status": "over_budget", "detail": queued_reason}), 429
+
+    try:
+        attachments = save_run_attachments(run_id, uploads)
+    except Exception as ex:
+        return jsonify({"status": "attachment_error", "detail": str(ex)}), 500
+
     with run_lock:
-        runs[run_id] = {
-            "thread": None,
-            "process": None,
-            "start": None,
-            "end": None,
-            "returncode": None,
-            "log": str(log_path),
-            "status": "queued",
-            "research_content": research_content[:100] + "..." if len(research_content) > 100 else research_content,  # Store truncated version for logging
-        }
+        runs[run_id] = dict(new_run_entry(log_path, research_content, user, attachments, queued_reason), thread=None)
+        meta = dict(runs[run_id])
+
+    ownership = register_run(coordinator, run_id, meta, research_content)
 
     logger.info(f"Starting thread for run_id: {run_id}")
-    thread = threading.Thread(target=run_research_script, args=(run_id, script_path, log_path, research_content), daemon=True)
+    thread = threading.Thread(target=run_research_script, args=(run_id, SCRIPT_PATH, log_path, research_content, ownership, attachments), daemon=True)
     with run_lock:
         runs[run_id]["thread"] = thread
     thread.start()
     
+    if queued_reason:
+        logger.info(f"Research queued with run_id: {run_id}: {queued_reason}")
+        return jsonify({"status": "queued", "run_id": run_id, "log": str(log_path), "detail": queued_reason}), 202
+
     logger.info(f"Research started with run_id: {run_id}")
     return jsonify({"status": "started", "run_id": run_id, "log": str(log_path)}), 202
 
 
+def _remote_status(run_id: str):
+    """Serve /status for a run owned by another instance from its shared record."""
+    safe_meta = remote_status(coordinator, run_id)
+    if safe_meta is None:
+        return jsonify({"error": "run_not_found"}), 404
+    return jsonify(safe_meta)
+
+
+def _remote_log_tail(run_id: str, tail_bytes: int):
+    """Serve /log for a run owned by another instance from its shared log blob."""
+    result = remote_log_range(coordinator, run_id, -tail_bytes, tail_bytes)
+    if result is None:
+        return jsonify({"error": "run_not_found"}), 404
+    return result[0].decode("utf-8", errors="replace"), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
 @app.route("/status", methods=["GET"])
 def status():
     """Return status for a specific run if run_id provided, otherwise a summary of runs."""
@@ -214,14 +308,11 @@ def status():
         if run_id:
             meta = runs.get(run_id)
             if not meta:
-                return jsonify({"error": "run_not_found"}), 404
+                return _remote_status(run_id)
             # Return a JSON-safe subset of metadata
-            safe_meta = {k: v for k, v in meta.items() if k not in ("process", "thread")}
-            # Determine running flag
             proc = meta.get("process")
             running = bool(proc and getattr(proc, "poll", lambda: 1)() is None)
-            safe_meta.update({"running": running})
-            return jsonify(safe_meta)
+            return jsonify(public_entry(meta, running))
 
         # no run_id: return brief summary
         summary = {rid: {"status": r.get("status"), "start": r.get("start"), "log": r.get("log")} for rid, r in runs.items()}
@@ -237,10 +328,15 @@ def get_log_tail():
     if not run_id:
         return jsonify({"error": "missing run_id"}), 400
 
+    try:
+        tail_bytes = int(request.args.get("bytes", "10000"))
+    except Exception:
+        tail_bytes = 10000
+
     with run_lock:
         meta = runs.get(run_id)
         if not meta:
-            return jsonify({"error": "run_not_found"}), 404
+            return _remote_log_tail(run_id, tail_bytes)
         log_path = meta.get("log")
 
     path = Path(log_path)
@@ -251,11 +347,6 @@ def get_log_tail():
         # Return helpful message instead of empty response
         return f"Log file not found: {path}\nRun status: {meta.get('status', 'unknown')}", 200, {"Content-Type": "text/plain; charset=utf-8"}
 
-    try:
-        tail_bytes = int(request.args.get("bytes", "10000"))
-    except Exception:
-        tail_bytes = 10000
-
     try:
         with open(path, "rb") as f:
             f.seek(0, os.SEEK_END)
@@ -278,8 +369,8 @@ def debug_info():
         'python_executable': sys.executable,
         'working_directory': os.getcwd(),
         'app_file_location': str(Path(__file__).resolve()),
-        'script_path': str(Path(__file__).resolve().parent / "split_deepresearcher_to_blob.py"),
-        'script_exists': (Path(__file__).resolve().parent / "split_deepresearcher_to_blob.py").exists(),
+        'script_path': str(SCRIPT_PATH),
+        'script_exists': SCRIPT_PATH.exists(),
         'temp_dir': os.getenv('TEMP', '/tmp'),
         'environment_vars': {
             'PROJECT_ENDPOINT': os.getenv('PROJECT_ENDPOINT', 'Not set'),
@@ -309,8 +400,11 @@ def list_blobs():
 
     items = []
     try:
-        for blob in container_client.list_blobs(name_starts_with=f"{run_folder}/"):
-            items.append({'name': blob.name, 'size': getattr(blob, 'size', None), 'last_modified': getattr(blob, 'last_modified', None).isoformat() if getattr(blob, 'last_modified', None) else None})
+        for blob in container_client.list_blobs(name_starts_with=f"{run_folder}/", include=['metadata']):
+            # chunk blobs of deduplicated runs are an implementation detail; manifests show their reassembled size
+            if is_chunk_blob(blob.name):
+                continue
+            items.append({'name': blob.name, 'size': logical_size(blob), 'last_modified': getattr(blob, 'last_modified', None).isoformat() if getattr(blob, 'last_modified', None) else None})
     except Exception as ex:
         return jsonify({'error': str(ex)}), 500
 
@@ -329,16 +423,102 @@ def download_blob():
 
     container_name = os.getenv('AZURE_STORAGE_CONTAINER_NAME', 'research-summaries')
     container_client = client.get_container_client(container_name)
-    blob_client = container_client.get_blob_client(name)
 
     try:
-        stream = blob_client.download_blob()
-        data = stream.readall()
-        return Response(data, mimetype='text/markdown; charset=utf-8', headers={"Content-Disposition": f"attachment; filename={Path(name).name}"})
+        # stream plain blobs and reassemble chunked manifests without buffering the whole document
+        byte_chunks, info = open_blob_stream(container_client, name)
+        headers = {"Content-Disposition": f"attachment; filename={Path(name).name}"}
+        if info.get('size') is not None:
+            headers["Content-Length"] = str(info['size'])
+        return Response(byte_chunks, mimetype='text/markdown; charset=utf-8', headers=headers)
     except Exception as ex:
         return jsonify({'error': str(ex)}), 500
 
 
+@app.route('/report', methods=['GET'])
+def view_report():
+    """Render a research markdown blob as sanitized HTML with a heading index.
+    Renders are cached per blob ETag, so repeat views skip both the download and the render.
+    Query params: name (required), page (optional, default=1)
+    """
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'error': 'missing name'}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', '1')))
+    except Exception:
+        page = 1
+
+    client = _get_sync_blob_service_client()
+    if not client:
+        return jsonify({'error': 'no_storage_credentials'}), 500
+
+    container_name = os.getenv('AZURE_STORAGE_CONTAINER_NAME', 'research-summaries')
+    container_client = client.get_container_client(container_name)
+
+    try:
+        etag = container_client.get_blob_client(name).get_blob_properties().etag
+        # the page ETag depends only on the blob version, so revalidations skip the cache and the render
+        tag = page_etag(etag, page)
+        if request.headers.get('If-None-Match') == tag:
+            return '', 304, page_headers(tag)
+        cache = get_report_cache()
+        report = cache.get(name, etag)
+        if report is None:
+            byte_chunks, _ = open_blob_stream(container_client, name)
+            report = render_report("".join(iter_decoded(byte_chunks)))
+            cache.put(name, etag, report)
+    except ResourceNotFoundError:
+        return jsonify({'error': 'blob_not_found'}), 404
+    except Exception as ex:
+        logger.error(f"Failed to render report {name}: {ex}")
+        return jsonify({'error': str(ex)}), 500
+
+    page = min(page, len(report['pages']))
+    html = render_template(
+        'report.html',
+        name=name,
+        title=report['title'],
+        headings=report['headings'],
+        page=page,
+        pages=len(report['pages']),
+        content=Markup(report['pages'][page - 1]),
+    )
+    return html, 200, page_headers(tag)
+
+
+@app.route('/usage', methods=['GET'])
+def usage_summary():
+    """Model token and grounded tool-call usage for a UTC day, in total and per user, with budgets.
+    Query params: day (optional, YYYY-MM-DD, default=today), user (optional)
+    """
+    return jsonify(get_usage_ledger().summary(day=request.args.get('day'), user=request.args.get('user')))
+
+
+@app.route('/search', methods=['GET'])
+def search_reports():
+    """Full-text search over indexed research artifacts.
+    Query params: q (required), limit (optional, default=10), run_folder (optional)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'missing q'}), 400
+
+    try:
+        limit = int(request.args.get('limit', '10'))
+    except Exception:
+        limit = 10
+
+    try:
+        result = get_search_index().search(query, limit=limit, run_folder=request.args.get('run_folder'))
+    except Exception as ex:
+        logger.error(f"Search failed for query '{query}': {ex}")
+        return jsonify({'error': str(ex)}), 500
+
+    return jsonify(result)
+
+
 def start_cleanup_thread():
     """Start a background daemon thread that removes runs (and their logs) older than RUN_CLEANUP_HOURS.
 
@@ -349,37 +529,10 @@ def start_cleanup_thread():
     def _cleanup_worker(max_age_seconds: int, interval_seconds: int):
         while True:
             now = datetime.now(timezone.utc)
-            to_remove = []
             with run_lock:
-                for rid, meta in list(runs.items()):
-                    status = meta.get("status")
-                    # skip active runs
-                    if status in ("running", "queued"):
-                        continue
-
-                    ts_str = meta.get("end") or meta.get("start")
-                    if not ts_str:
-                        continue
-                    try:
-                        ts = datetime.fromisoformat(ts_str)
-                    except Exception:
-                        continue
-
-                    age = (now - ts).total_seconds()
-                    if age > max_age_seconds:
-                        to_remove.append(rid)
-
-                for rid in to_remove:
-                    meta = runs.pop(rid, None)
-                    if not meta:
-                        continue
-                    # delete log file if present
-                    try:
-                        logp = Path(meta.get("log" or ""))
-                        if logp and logp.exists():
-                            logp.unlink()
-                    except Exception as e:
-                        print(f"cleanup: failed to delete log for {rid}: {e}")
+                expired = [(rid, runs.pop(rid)) for rid, meta in list(runs.items()) if is_expired(meta, now, max_age_seconds)]
+            for rid, meta in expired:
+                remove_run_files(coordinator, rid, meta)
 
             time.sleep(interval_seconds)
 
@@ -390,8 +543,43 @@ def start_cleanup_thread():
     return t
 
 
+def start_coordination_thread():
+    """Start a background daemon thread that takes over runs abandoned by other instances.
+
+    A run whose record lease expired (its instance stopped or was scaled in) is restarted
+    here. Environment variables:
+    - RUN_COORDINATION_SWEEP_SECONDS (default 30)
+    """
+    def _takeover_worker(interval_seconds: int):
+        while True:
+            try:
+                taken = coordinator.take_over_stale_runs()
+            except Exception as ex:
+                logger.warning(f"Stale run sweep failed: {ex}")
+                taken = []
+            for ownership in taken:
+                run_id = ownership.run_id
+                log_path = new_log_path(run_id)
+                research_content = ownership.record.get("prompt")
+                with run_lock:
+                    runs[run_id] = dict(takeover_entry(ownership, log_path), thread=None)
+                thread = threading.Thread(target=run_research_script, args=(run_id, SCRIPT_PATH, log_path, research_content, ownership), daemon=True)
+                with run_lock:
+                    runs[run_id]["thread"] = thread
+                thread.start()
+                logger.info(f"Resumed run {run_id} taken over from another instance")
+            time.sleep(interval_seconds)
+
+    interval = int(os.getenv("RUN_COORDINATION_SWEEP_SECONDS", "30"))
+    t = threading.Thread(target=_takeover_worker, args=(interval,), daemon=True)
+    t.start()
+    return t
+
+
 # Start cleanup thread on import so old runs/logs are pruned automatically
 start_cleanup_thread()
+if coordinator:
+    start_coordination_thread()
 
 
 if __name__ == "__main__":
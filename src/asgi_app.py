@@ -0,0 +1,638 @@
+"""Async (ASGI) serving mode for the researcher web app.
+
+Serves the same routes and index.html as app.py, but storage I/O, log reads and
+researcher subprocesses are all awaited on one event loop, so a single worker can hold
+hundreds of concurrent viewers and runs. Run it with:
+
+    gunicorn -k uvicorn.workers.UvicornWorker --bind 0.0.0.0:$PORT asgi_app:app
+"""
+from quart import Quart, render_template, request, jsonify
+from quart import Response
+from markupsafe import Markup
+import asyncio
+import sys
+import os
+import logging
+from pathlib import Path
+from datetime import datetime, timezone
+import uuid
+
+import aiohttp
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob.aio import BlobServiceClient
+
+from chunk_store import is_chunk_blob, logical_size, open_blob_stream_async
+from report_view import get_report_cache, page_etag, page_headers, render_report
+from research_inputs import cleanup_inputs, max_upload_bytes
+from research_runs import (
+    SCRIPT_PATH,
+    admit_run,
+    current_user,
+    get_research_python,
+    get_storage_connection_string,
+    is_expired,
+    log_header,
+    new_log_path,
+    new_run_entry,
+    public_entry,
+    publish_run,
+    readmit_queued_run,
+    register_run,
+    release_usage,
+    remote_log_range,
+    remote_status,
+    remove_run_files,
+    researcher_command,
+    researcher_env,
+    save_run_attachments,
+    settle_usage,
+    takeover_entry,
+    usage_path_for,
+)
+from research_search import get_search_index
+from run_coordination import ACTIVE_STATUSES, get_run_coordinator
+from usage_accounting import get_usage_ledger
+
+# Configure logging for Azure App Service
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__, template_folder="templates")
+# /start accepts multi-megabyte supporting documents, which Quart spools to disk while parsing
+app.config["MAX_CONTENT_LENGTH"] = max_upload_bytes()
+app.config["BODY_TIMEOUT"] = int(os.getenv("RESEARCH_UPLOAD_TIMEOUT_SECONDS", "600"))
+
+# Runs are only touched from the event loop, so no lock is needed
+runs = {}  # mapping: run_id -> { task, process, start, end, returncode, log, status }
+
+# Shared async blob client (with its pooled HTTP session), created when serving starts
+blob_service_client = None
+blob_http_session = None
+
+# Shared run records/logs in blob storage so any scaled-out instance can serve any run (None when disabled)
+coordinator = get_run_coordinator()
+
+def _get_container_client():
+    if blob_service_client is None:
+        return None
+    return blob_service_client.get_container_client(os.getenv('AZURE_STORAGE_CONTAINER_NAME', 'research-summaries'))
+
+
+def _is_running(meta) -> bool:
+    proc = meta.get("process")
+    return bool(proc and proc.returncode is None)
+
+
+def _read_log_range(path: Path, start: int, max_bytes: int):
+    """Blocking helper run in a worker thread: return (data, size) read from start (negative = tail)."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        if start < 0:
+            start = max(0, size + start)
+        f.seek(min(start, size))
+        return f.read(max_bytes), size
+
+
+LOG_STREAM_READ_BYTES = 64 * 1024
+
+
+def _utf8_boundary(data: bytes) -> int:
+    """Length of data without an incomplete UTF-8 sequence at its end."""
+    i = len(data)
+    # step back over up to three continuation bytes to the sequence's lead byte
+    while i > 0 and len(data) - i < 3 and data[i - 1] & 0xC0 == 0x80:
+        i -= 1
+    if i == 0:
+        return len(data)
+    lead = data[i - 1]
+    needed = 2 if lead & 0xE0 == 0xC0 else 3 if lead & 0xF0 == 0xE0 else 4 if lead & 0xF8 == 0xF0 else 1
+    return len(data) if len(data) - (i - 1) >= needed else i - 1
+
+
+def _sendable_length(data: bytes, final: bool) -> int:
+    """How many leading bytes of a log read to send as one stream event.
+
+    Events end on a line break, so a character split across two reads is never decoded
+    in halves; the rest is read again from the new offset. A line longer than a read, or
+    the unterminated last line of a finished run, is cut at a UTF-8 character boundary instead.
+    """
+    end = data.rfind(b"\n") + 1
+    if end == 0 and (final or len(data) >= LOG_STREAM_READ_BYTES):
+        end = _utf8_boundary(data)
+    return end
+
+
+@app.before_serving
+async def startup():
+    global blob_service_client, blob_http_session
+    conn_str = get_storage_connection_string()
+    if conn_str:
+        # One connection pool shared by every request instead of a client per call
+        pool_size = int(os.getenv("BLOB_CONNECTION_POOL_SIZE", "100"))
+        blob_http_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=pool_size))
+        transport = AioHttpTransport(session=blob_http_session, session_owner=False)
+        try:
+            blob_service_client = BlobServiceClient.from_connection_string(conn_str, transport=transport)
+        except Exception as ex:
+            logger.error(f"Failed to create blob service client: {ex}")
+    app.add_background_task(cleanup_worker)
+    if coordinator:
+        app.add_background_task(takeover_worker)
+
+
+@app.after_serving
+async def shutdown():
+    if blob_service_client is not None:
+        await blob_service_client.close()
+    if blob_http_session is not None:
+        await blob_http_session.close()
+
+
+async def _wait_with_heartbeat(proc, ownership, log_path: Path) -> int:
+    """Wait for the researcher process, renewing the run's ownership lease while it runs."""
+    if ownership is None:
+        return await proc.wait()
+    interval = int(os.getenv("RUN_HEARTBEAT_SECONDS", "15"))
+    while True:
+        try:
+            return await asyncio.wait_for(asyncio.shield(proc.wait()), timeout=interval)
+        except asyncio.TimeoutError:
+            if not await asyncio.to_thread(ownership.heartbeat, log_path):
+                # another instance may already be running this research; stop our copy
+                logger.error(f"Lost ownership of run {ownership.run_id}, stopping researcher process")
+                proc.kill()
+                return await proc.wait()
+
+
+async def _publish_run(ownership, log_path: Path, final: bool = False, **fields) -> None:
+    """Best-effort update of the shared run record, off the event loop."""
+    await asyncio.to_thread(publish_run, ownership, log_path, final, **fields)
+
+
+async def _wait_for_admission(run_id: str, user: str, ownership) -> None:
+    """Hold a queued run until the usage budget admits it (no-op once budget is reserved)."""
+    interval = int(os.getenv("USAGE_QUEUE_POLL_SECONDS", "15"))
+    while True:
+        reason = await asyncio.to_thread(readmit_queued_run, run_id, user)
+        if reason is None:
+            runs[run_id].pop("queued_reason", None)
+            return
+        runs[run_id]["queued_reason"] = reason
+        # keep the ownership lease alive while waiting so the run is not taken over
+        if ownership is not None and not await asyncio.to_thread(ownership.heartbeat):
+            raise RuntimeError("lost ownership of the run while waiting for usage budget")
+        await asyncio.sleep(interval)
+
+
+async def _send_prompt(proc, research_content: str) -> None:
+    """Hand the research prompt to the researcher on stdin and close it."""
+    try:
+        proc.stdin.write((research_content or "").encode("utf-8"))
+        await proc.stdin.drain()
+    except (BrokenPipeError, ConnectionResetError):
+        # the researcher exited before reading its prompt; its log explains why
+        pass
+    finally:
+        proc.stdin.close()
+
+
+async def run_research_task(run_id: str, script_path: Path, log_path: Path, research_content: str = None, ownership=None, attachments=None) -> None:
+    """Run the deep research script as an asyncio subprocess and update runs metadata.
+
+    The prompt is passed on stdin rather than argv; attachments are file paths the
+    researcher uploads to the agent.
+    """
+    logger.info(f"Starting research script for run_id: {run_id}")
+    meta = runs[run_id]
+    user = meta.get("user") or "anonymous"
+    usage_path = usage_path_for(log_path)
+    python_exe = get_research_python()
+    try:
+        await _wait_for_admission(run_id, user, ownership)
+
+        meta["start"] = datetime.now(timezone.utc).isoformat()
+        meta["end"] = None
+        meta["returncode"] = None
+        meta["status"] = "running"
+        await _publish_run(ownership, log_path, status="running", start=meta["start"], end=None, returncode=None)
+
+        header = log_header(run_id, python_exe, script_path, research_content, attachments)
+        await asyncio.to_thread(log_path.write_text, header, encoding="utf-8")
+
+        env = researcher_env(usage_path)
+        cmd = researcher_command(python_exe, script_path, attachments)
+
+        with open(log_path, "ab") as log_fp:
+            proc = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=log_fp,
+                stderr=asyncio.subprocess.STDOUT,
+                cwd=str(script_path.parent),
+                env=env,
+            )
+            meta["process"] = proc
+            await _send_prompt(proc, research_content)
+            returncode = await _wait_with_heartbeat(proc, ownership, log_path)
+        logger.info(f"Process finished with return code: {returncode}")
+
+        meta["usage"] = await asyncio.to_thread(settle_usage, run_id, user, usage_path)
+
+        meta["end"] = datetime.now(timezone.utc).isoformat()
+        meta["returncode"] = returncode
+        meta["status"] = "completed" if returncode == 0 else "failed"
+    except Exception as ex:
+        logger.error(f"Exception in run_research_task: {ex}", exc_info=True)
+        try:
+            with open(log_path, "ab") as log_fp:
+                log_fp.write(f"\nException while running researcher: {ex}\n".encode("utf-8", errors="replace"))
+        except Exception as log_ex:
+            logger.error(f"Failed to write error to log: {log_ex}")
+        await asyncio.to_thread(release_usage, run_id)
+        meta["end"] = datetime.now(timezone.utc).isoformat()
+        meta["returncode"] = -1
+        meta["status"] = "failed"
+
+    await _publish_run(ownership, log_path, final=True, status=meta["status"], end=meta["end"], returncode=meta["returncode"], usage=meta.get("usage"))
+    await asyncio.to_thread(cleanup_inputs, run_id)
+
+
+@app.route("/", methods=["GET"])
+async def index():
+    running = any(_is_running(r) for r in runs.values())
+    return await render_template("index.html", running=running, last_run=None)
+
+
+@app.route("/start", methods=["POST"])
+async def start():
+    logger.info("Received start request")
+    if not SCRIPT_PATH.exists():
+        logger.error(f"Script not found: {SCRIPT_PATH}")
+        return jsonify({"status": "missing_script", "detail": str(SCRIPT_PATH)}), 500
+
+    # Get research content from a JSON payload, or from a multipart form carrying attachments
+    research_content = None
+    uploads = []
+    if request.is_json:
+        data = await request.get_json()
+        research_content = data.get('research_content', '').strip() if data else None
+    elif request.mimetype == 'multipart/form-data':
+        form = await request.form
+        files = await request.files
+        research_content = form.get('research_content', '').strip()
+        uploads = [f for f in files.getlist('attachments') if f and f.filename]
+    logger.info(f"Received research content: {len(research_content) if research_content else 0} characters, {len(uploads)} attachments")
+
+    if not research_content:
+        logger.warning("No research content provided")
+        return jsonify({"status": "missing_content", "detail": "Research content is required"}), 400
+
+    run_id = uuid.uuid4().hex
+    log_path = await asyncio.to_thread(new_log_path, run_id)
+
+    # Admission: reserve usage budget for the run, or reject/queue it when a budget would be exceeded
+    user = current_user(request.headers)
+    try:
+        queued_reason, rejected = await asyncio.to_thread(admit_run, run_id, user)
+    except Exception as ex:
+        return jsonify({"status": "admission_unavailable", "detail": str(ex)}), 503
+    if rejected:
+        return jsonify({"status": "over_budget", "detail": queued_reason}), 429
+
+    try:
+        attachments = await asyncio.to_thread(save_run_attachments, run_id, uploads)
+    except Exception as ex:
+        return jsonify({"status": "attachment_error", "detail": str(ex)}), 500
+
+    runs[run_id] = dict(new_run_entry(log_path, research_content, user, attachments, queued_reason), task=None)
+    ownership = await asyncio.to_thread(register_run, coordinator, run_id, dict(runs[run_id]), research_content)
+    runs[run_id]["task"] = asyncio.create_task(run_research_task(run_id, SCRIPT_PATH, log_path, research_content, ownership, attachments))
+
+    if queued_reason:
+        logger.info(f"Research queued with run_id: {run_id}: {queued_reason}")
+        return jsonify({"status": "queued", "run_id": run_id, "log": str(log_path), "detail": queued_reason}), 202
+
+    logger.info(f"Research started with run_id: {run_id}")
+    return jsonify({"status": "started", "run_id": run_id, "log": str(log_path)}), 202
+
+
+async def _remote_status(run_id: str):
+    """Serve /status for a run owned by another instance from its shared record."""
+    safe_meta = await asyncio.to_thread(remote_status, coordinator, run_id)
+    if safe_meta is None:
+        return jsonify({"error": "run_not_found"}), 404
+    return jsonify(safe_meta)
+
+
+async def _remote_log_tail(run_id: str, tail_bytes: int):
+    """Serve /log for a run owned by another instance from its shared log blob."""
+    result = await asyncio.to_thread(remote_log_range, coordinator, run_id, -tail_bytes, tail_bytes)
+    if result is None:
+        return jsonify({"error": "run_not_found"}), 404
+    return result[0].decode("utf-8", errors="replace"), 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+
+@app.route("/status", methods=["GET"])
+async def status():
+    """Return status for a specific run if run_id provided, otherwise a summary of runs."""
+    run_id = request.args.get("run_id")
+    if run_id:
+        meta = runs.get(run_id)
+        if not meta:
+            return await _remote_status(run_id)
+        return jsonify(public_entry(meta, _is_running(meta)))
+
+    summary = {rid: {"status": r.get("status"), "start": r.get("start"), "log": r.get("log")} for rid, r in runs.items()}
+    return jsonify({"runs": summary})
+
+
+@app.route("/log", methods=["GET"])
+async def get_log_tail():
+    """Return the tail (last N bytes) of the run-specific log file as plain text.
+    Query params: run_id (required), bytes (optional, default=10000)
+    """
+    run_id = request.args.get("run_id")
+    if not run_id:
+        return jsonify({"error": "missing run_id"}), 400
+
+    try:
+        tail_bytes = int(request.args.get("bytes", "10000"))
+    except Exception:
+        tail_bytes = 10000
+
+    meta = runs.get(run_id)
+    if not meta:
+        return await _remote_log_tail(run_id, tail_bytes)
+    path = Path(meta.get("log"))
+
+    if not path.exists():
+        return f"Log file not found: {path}\nRun status: {meta.get('status', 'unknown')}", 200, {"Content-Type": "text/plain; charset=utf-8"}
+
+    try:
+        data, _ = await asyncio.to_thread(_read_log_range, path, -tail_bytes, tail_bytes)
+        return data.decode("utf-8", errors="replace"), 200, {"Content-Type": "text/plain; charset=utf-8"}
+    except Exception as ex:
+        logger.error(f"Error reading log file {path}: {ex}")
+        return f"Error reading log: {ex}\nPath: {path}\nExists: {path.exists()}", 500
+
+
+@app.route("/log/stream", methods=["GET"])
+async def stream_log():
+    """Stream a run's log as Server-Sent Events until the run finishes.
+    Each event carries new log text, normally whole lines; its id is the byte offset,
+    so a reconnecting EventSource resumes via Last-Event-ID. Query params: run_id (required), offset (optional)
+    """
+    run_id = request.args.get("run_id")
+    if not run_id:
+        return jsonify({"error": "missing run_id"}), 400
+    meta = runs.get(run_id)
+
+    try:
+        offset = int(request.headers.get("Last-Event-ID") or request.args.get("offset", "0"))
+    except Exception:
+        offset = 0
+    poll_seconds = float(os.getenv("LOG_STREAM_POLL_SECONDS", "1"))
+
+    if meta:
+        path = Path(meta.get("log"))
+
+        async def read_more(offset: int):
+            """(new log bytes, run status) of a run executing on this instance."""
+            status = meta.get("status")
+            if not path.exists():
+                return b"", status
+            data, _ = await asyncio.to_thread(_read_log_range, path, offset, LOG_STREAM_READ_BYTES)
+            return data, status
+    else:
+        # run owned by another instance: follow its shared record and log blob
+        record = await asyncio.to_thread(remote_status, coordinator, run_id)
+        if record is None:
+            return jsonify({"error": "run_not_found"}), 404
+        poll_seconds = max(poll_seconds, float(os.getenv("REMOTE_LOG_STREAM_POLL_SECONDS", "5")))
+
+        async def read_more(offset: int):
+            """(new log bytes, run status) of a run executing on another instance."""
+            record = await asyncio.to_thread(remote_status, coordinator, run_id)
+            status = record.get("status") if record else "unknown"
+            result = await asyncio.to_thread(remote_log_range, coordinator, run_id, offset, LOG_STREAM_READ_BYTES)
+            return (result[0] if result else b""), status
+
+    async def events():
+        nonlocal offset
+        while True:
+            data, status = await read_more(offset)
+            finished = status not in ACTIVE_STATUSES
+            end = _sendable_length(data, finished)
+            if end:
+                offset += end
+                lines = data[:end].decode("utf-8", errors="replace").split("\n")
+                yield (f"id: {offset}\n" + "".join(f"data: {line}\n" for line in lines) + "\n").encode("utf-8")
+                continue
+            if finished:
+                yield f"event: end\ndata: {status}\n\n".encode("utf-8")
+                return
+            # comment line keeps idle connections alive through proxies
+            yield b": keep-alive\n\n"
+            await asyncio.sleep(poll_seconds)
+
+    response = Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    response.timeout = None
+    return response
+
+
+@app.route('/debug', methods=['GET'])
+async def debug_info():
+    """Debug endpoint to help diagnose Azure App Service issues."""
+    info = {
+        'serving_mode': 'asgi',
+        'python_executable': sys.executable,
+        'working_directory': os.getcwd(),
+        'app_file_location': str(Path(__file__).resolve()),
+        'script_path': str(SCRIPT_PATH),
+        'script_exists': SCRIPT_PATH.exists(),
+        'temp_dir': os.getenv('TEMP', '/tmp'),
+        'environment_vars': {
+            'PROJECT_ENDPOINT': os.getenv('PROJECT_ENDPOINT', 'Not set'),
+            'AZURE_STORAGE_ACCOUNT_NAME': os.getenv('AZURE_STORAGE_ACCOUNT_NAME', 'Not set'),
+            'BING_RESOURCE_NAME': os.getenv('BING_RESOURCE_NAME', 'Not set'),
+            'MODEL_DEPLOYMENT_NAME': os.getenv('MODEL_DEPLOYMENT_NAME', 'Not set'),
+            'DEEP_RESEARCH_MODEL_DEPLOYMENT_NAME': os.getenv('DEEP_RESEARCH_MODEL_DEPLOYMENT_NAME', 'Not set'),
+        },
+        'active_runs': len(runs),
+        'runs_summary': {run_id: {'status': meta.get('status'), 'start': meta.get('start')} for run_id, meta in runs.items()}
+    }
+    return jsonify(info)
+
+
+@app.route('/blobs', methods=['GET'])
+async def list_blobs():
+    run_folder = request.args.get('run_folder')
+    if not run_folder:
+        return jsonify({'error': 'missing run_folder'}), 400
+
+    container_client = _get_container_client()
+    if not container_client:
+        return jsonify({'error': 'no_storage_credentials'}), 500
+
+    items = []
+    try:
+        async for blob in container_client.list_blobs(name_starts_with=f"{run_folder}/", include=['metadata']):
+            if is_chunk_blob(blob.name):
+                continue
+            items.append({'name': blob.name, 'size': logical_size(blob), 'last_modified': blob.last_modified.isoformat() if blob.last_modified else None})
+    except Exception as ex:
+        return jsonify({'error': str(ex)}), 500
+
+    return jsonify({'blobs': items})
+
+
+@app.route('/blob/download', methods=['GET'])
+async def download_blob():
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'error': 'missing name'}), 400
+
+    container_client = _get_container_client()
+    if not container_client:
+        return jsonify({'error': 'no_storage_credentials'}), 500
+
+    try:
+        byte_chunks, info = await open_blob_stream_async(container_client, name)
+        headers = {"Content-Disposition": f"attachment; filename={Path(name).name}"}
+        if info.get('size') is not None:
+            headers["Content-Length"] = str(info['size'])
+        response = Response(byte_chunks, mimetype='text/markdown; charset=utf-8', headers=headers)
+        response.timeout = None
+        return response
+    except Exception as ex:
+        return jsonify({'error': str(ex)}), 500
+
+
+@app.route('/report', methods=['GET'])
+async def view_report():
+    """Render a research markdown blob as sanitized HTML with a heading index.
+    Renders are cached per blob ETag, so repeat views skip both the download and the render.
+    Query params: name (required), page (optional, default=1)
+    """
+    name = request.args.get('name')
+    if not name:
+        return jsonify({'error': 'missing name'}), 400
+
+    try:
+        page = max(1, int(request.args.get('page', '1')))
+    except Exception:
+        page = 1
+
+    container_client = _get_container_client()
+    if not container_client:
+        return jsonify({'error': 'no_storage_credentials'}), 500
+
+    try:
+        properties = await container_client.get_blob_client(name).get_blob_properties()
+        etag = properties.etag
+        # the page ETag depends only on the blob version, so revalidations skip the cache and the render
+        tag = page_etag(etag, page)
+        if request.headers.get('If-None-Match') == tag:
+            return '', 304, page_headers(tag)
+        cache = get_report_cache()
+        report = await asyncio.to_thread(cache.get, name, etag)
+        if report is None:
+            byte_chunks, _ = await open_blob_stream_async(container_client, name)
+            data = b"".join([chunk async for chunk in byte_chunks])
+            report = await asyncio.to_thread(render_report, data.decode("utf-8", errors="replace"))
+            await asyncio.to_thread(cache.put, name, etag, report)
+    except ResourceNotFoundError:
+        return jsonify({'error': 'blob_not_found'}), 404
+    except Exception as ex:
+        logger.error(f"Failed to render report {name}: {ex}")
+        return jsonify({'error': str(ex)}), 500
+
+    page = min(page, len(report['pages']))
+    html = await render_template(
+        'report.html',
+        name=name,
+        title=report['title'],
+        headings=report['headings'],
+        page=page,
+        pages=len(report['pages']),
+        content=Markup(report['pages'][page - 1]),
+    )
+    return html, 200, page_headers(tag)
+
+
+@app.route('/usage', methods=['GET'])
+async def usage_summary():
+    """Model token and grounded tool-call usage for a UTC day, in total and per user, with budgets.
+    Query params: day (optional, YYYY-MM-DD, default=today), user (optional)
+    """
+    summary = await asyncio.to_thread(get_usage_ledger().summary, request.args.get('day'), request.args.get('user'))
+    return jsonify(summary)
+
+
+@app.route('/search', methods=['GET'])
+async def search_reports():
+    """Full-text search over indexed research artifacts.
+    Query params: q (required), limit (optional, default=10), run_folder (optional)
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'missing q'}), 400
+
+    try:
+        limit = int(request.args.get('limit', '10'))
+    except Exception:
+        limit = 10
+
+    try:
+        result = await asyncio.to_thread(get_search_index().search, query, limit, request.args.get('run_folder'))
+    except Exception as ex:
+        logger.error(f"Search failed for query '{query}': {ex}")
+        return jsonify({'error': str(ex)}), 500
+
+    return jsonify(result)
+
+
+async def cleanup_worker():
+    """Remove finished runs (and their logs) older than RUN_CLEANUP_HOURS every RUN_CLEANUP_INTERVAL_SECONDS."""
+    max_age_seconds = int(os.getenv("RUN_CLEANUP_HOURS", "24")) * 3600
+    interval_seconds = int(os.getenv("RUN_CLEANUP_INTERVAL_SECONDS", "3600"))
+    while True:
+        now = datetime.now(timezone.utc)
+        for rid, meta in list(runs.items()):
+            if is_expired(meta, now, max_age_seconds):
+                runs.pop(rid, None)
+                await asyncio.to_thread(remove_run_files, coordinator, rid, meta)
+        await asyncio.sleep(interval_seconds)
+
+
+async def takeover_worker():
+    """Restart runs abandoned by other instances every RUN_COORDINATION_SWEEP_SECONDS."""
+    interval_seconds = int(os.getenv("RUN_COORDINATION_SWEEP_SECONDS", "30"))
+    while True:
+        try:
+            taken = await asyncio.to_thread(coordinator.take_over_stale_runs)
+        except Exception as ex:
+            logger.warning(f"Stale run sweep failed: {ex}")
+            taken = []
+        for ownership in taken:
+            run_id = ownership.run_id
+            log_path = await asyncio.to_thread(new_log_path, run_id)
+            runs[run_id] = dict(takeover_entry(ownership, log_path), task=None)
+            runs[run_id]["task"] = asyncio.create_task(
+                run_research_task(run_id, SCRIPT_PATH, log_path, ownership.record.get("prompt"), ownership)
+            )
+            logger.info(f"Resumed run {run_id} taken over from another instance")
+        await asyncio.sleep(interval_seconds)
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", "8000"))
+    app.run(host="0.0.0.0", port=port)
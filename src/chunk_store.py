@@ -0,0 +1,195 @@
+import hashlib
+import json
+import os
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from azure.core.exceptions import ResourceExistsError
+from azure.storage.blob import ContentSettings
+
+# Blob metadata marking a blob as a chunk manifest rather than the document itself
+MANIFEST_FORMAT = "chunked-v1"
+FORMAT_METADATA_KEY = "research_format"
+SIZE_METADATA_KEY = "logical_size"
+CHUNKS_DIR = ".chunks"
+
+# Content-defined chunking parameters. Research steps are a few to a few hundred KB of
+# markdown, so small chunks give the best reuse between successive steps.
+MIN_CHUNK_SIZE = 1024
+AVG_CHUNK_BITS = 12  # ~4 KiB average chunk
+MAX_CHUNK_SIZE = 16 * 1024
+
+_CHUNK_MASK = (1 << AVG_CHUNK_BITS) - 1
+_HASH_MASK = (1 << 64) - 1
+# Deterministic gear table so chunk boundaries are stable across processes and instances
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([i])).digest()[:8], "big") for i in range(256)]
+
+# Chunk blobs this process already knows to exist, so repeated chunks skip the existence check
+_known_chunks = set()
+
+
+def chunked_storage_enabled() -> bool:
+    """True when RESEARCH_STORAGE_FORMAT=chunked; the default stores plain markdown blobs."""
+    return os.getenv("RESEARCH_STORAGE_FORMAT", "plain").lower() == "chunked"
+
+
+def chunk_prefix(blob_name: str) -> str:
+    """Return the folder holding chunks for `blob_name`.
+
+    RESEARCH_CHUNK_SCOPE=run (default) keeps chunks inside the run folder so a run can be
+    deleted as a unit; RESEARCH_CHUNK_SCOPE=container shares chunks across all runs, and
+    nothing ever removes them (they outlive the runs that reference them).
+    """
+    if os.getenv("RESEARCH_CHUNK_SCOPE", "run").lower() == "container":
+        return CHUNKS_DIR
+    run_folder = blob_name.rpartition("/")[0]
+    return f"{run_folder}/{CHUNKS_DIR}" if run_folder else CHUNKS_DIR
+
+
+def is_chunk_blob(blob_name: str) -> bool:
+    return blob_name.startswith(f"{CHUNKS_DIR}/") or f"/{CHUNKS_DIR}/" in blob_name
+
+
+def is_manifest(metadata: Optional[Dict[str, str]]) -> bool:
+    return bool(metadata) and metadata.get(FORMAT_METADATA_KEY) == MANIFEST_FORMAT
+
+
+def logical_size(blob) -> Optional[int]:
+    """Size users see for a listed blob: the reassembled size for manifests."""
+    metadata = getattr(blob, "metadata", None)
+    if is_manifest(metadata):
+        try:
+            return int(metadata.get(SIZE_METADATA_KEY))
+        except (TypeError, ValueError):
+            return None
+    return getattr(blob, "size", None)
+
+
+def split_chunks(data: bytes) -> List[bytes]:
+    """Split data into content-defined chunks using a gear rolling hash.
+
+    Boundaries depend only on nearby content, so text shared between documents yields
+    identical chunks even when it appears at different offsets.
+    """
+    chunks: List[bytes] = []
+    gear = _GEAR
+    start = 0
+    length = len(data)
+    while start < length:
+        end = min(start + MAX_CHUNK_SIZE, length)
+        cut = end
+        h = 0
+        for i in range(start + MIN_CHUNK_SIZE, end):
+            h = ((h << 1) + gear[data[i]]) & _HASH_MASK
+            if not (h >> (64 - AVG_CHUNK_BITS)) & _CHUNK_MASK:
+                cut = i + 1
+                break
+        chunks.append(data[start:cut])
+        start = cut
+    return chunks
+
+
+def build_manifest(blob_name: str, data: bytes, content_type: str) -> Tuple[Dict[str, object], List[Tuple[str, bytes]]]:
+    """Return (manifest, [(chunk_id, chunk_bytes)]) for data."""
+    entries = []
+    chunks = []
+    for chunk in split_chunks(data):
+        chunk_id = hashlib.sha256(chunk).hexdigest()
+        entries.append({"id": chunk_id, "size": len(chunk)})
+        chunks.append((chunk_id, chunk))
+    manifest = {
+        "format": MANIFEST_FORMAT,
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "content_type": content_type,
+        "chunk_prefix": chunk_prefix(blob_name),
+        "chunks": entries,
+    }
+    return manifest, chunks
+
+
+async def upload_chunked(container_client, blob_name: str, data: bytes, content_type: str) -> Dict[str, int]:
+    """Upload data as deduplicated chunks plus a manifest stored under blob_name.
+
+    Only chunks not already present in the store are sent. Returns upload statistics.
+    """
+    manifest, chunks = build_manifest(blob_name, data, content_type)
+    prefix = manifest["chunk_prefix"]
+    container_key = getattr(container_client, "container_name", "")
+    new_chunks = 0
+    bytes_uploaded = 0
+
+    for chunk_id, chunk in chunks:
+        chunk_name = f"{prefix}/{chunk_id}"
+        cache_key = f"{container_key}/{chunk_name}"
+        if cache_key in _known_chunks:
+            continue
+        chunk_client = container_client.get_blob_client(chunk_name)
+        try:
+            # conditional create: one round trip, and a chunk that already exists is left untouched
+            await chunk_client.upload_blob(chunk, overwrite=False)
+            new_chunks += 1
+            bytes_uploaded += len(chunk)
+        except ResourceExistsError:
+            # stored by an earlier step, run or instance
+            pass
+        _known_chunks.add(cache_key)
+
+    manifest_bytes = json.dumps(manifest, separators=(",", ":")).encode("utf-8")
+    await container_client.get_blob_client(blob_name).upload_blob(
+        manifest_bytes,
+        overwrite=True,
+        content_settings=ContentSettings(content_type="application/json"),
+        metadata={FORMAT_METADATA_KEY: MANIFEST_FORMAT, SIZE_METADATA_KEY: str(len(data))},
+    )
+    bytes_uploaded += len(manifest_bytes)
+
+    return {"chunks": len(chunks), "new_chunks": new_chunks, "bytes_uploaded": bytes_uploaded, "size": len(data)}
+
+
+def open_blob_stream(container_client, blob_name: str) -> Tuple[Iterator[bytes], Dict[str, object]]:
+    """Open a blob for streaming, transparently reassembling chunked manifests.
+
+    Returns (byte_chunk_iterator, info) where info has 'size' and 'content_type'.
+    The first request is made eagerly so missing blobs raise here rather than mid-stream.
+    """
+    blob_client = container_client.get_blob_client(blob_name)
+    downloader = blob_client.download_blob()
+    properties = downloader.properties
+    if not is_manifest(properties.metadata):
+        content_type = properties.content_settings.content_type if properties.content_settings else None
+        return downloader.chunks(), {"size": properties.size, "content_type": content_type}
+
+    manifest = json.loads(downloader.readall())
+    prefix = manifest.get("chunk_prefix") or chunk_prefix(blob_name)
+
+    def _reassemble() -> Iterator[bytes]:
+        for entry in manifest["chunks"]:
+            chunk = container_client.get_blob_client(f"{prefix}/{entry['id']}").download_blob().readall()
+            if hashlib.sha256(chunk).hexdigest() != entry["id"]:
+                raise IOError(f"Chunk {entry['id']} of '{blob_name}' failed integrity check")
+            yield chunk
+
+    return _reassemble(), {"size": manifest.get("size"), "content_type": manifest.get("content_type")}
+
+
+async def open_blob_stream_async(container_client, blob_name: str) -> Tuple[AsyncIterator[bytes], Dict[str, object]]:
+    """Async counterpart of open_blob_stream for clients from azure.storage.blob.aio."""
+    blob_client = container_client.get_blob_client(blob_name)
+    downloader = await blob_client.download_blob()
+    properties = downloader.properties
+    if not is_manifest(properties.metadata):
+        content_type = properties.content_settings.content_type if properties.content_settings else None
+        return downloader.chunks(), {"size": properties.size, "content_type": content_type}
+
+    manifest = json.loads(await downloader.readall())
+    prefix = manifest.get("chunk_prefix") or chunk_prefix(blob_name)
+
+    async def _reassemble() -> AsyncIterator[bytes]:
+        for entry in manifest["chunks"]:
+            chunk_downloader = await container_client.get_blob_client(f"{prefix}/{entry['id']}").download_blob()
+            chunk = await chunk_downloader.readall()
+            if hashlib.sha256(chunk).hexdigest() != entry["id"]:
+                raise IOError(f"Chunk {entry['id']} of '{blob_name}' failed integrity check")
+            yield chunk
+
+    return _reassemble(), {"size": manifest.get("size"), "content_type": manifest.get("content_type")}
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import markdown
+import nh3
+
+# create_consolidated_summary writes one "## Research Step NN <timestamp>" heading per step,
+# whose toc slug is research-step-NN-...; pages break only in front of those, so headings
+# copied in from the step bodies stay with their step. Reports without step headings
+# (single steps, final summaries) are split in front of every second-level heading.
+_STEP_ANCHOR_RE = re.compile(r"research-step-\d+")
+_STEP_SPLIT_RE = re.compile(r'(?=<h2 id="research-step-\d+)')
+_SECTION_SPLIT_RE = re.compile(r"(?=<h2[\s>])")
+_TOC_SECTION_RE = re.compile(r"<h2[^>]*>\s*Table of Contents\s*</h2>", re.IGNORECASE)
+
+_HEADING_ATTRIBUTES = {f"h{level}": {"id"} for level in range(1, 7)}
+
+
+def _sanitize(html: str) -> str:
+    attributes = {tag: set(attrs) for tag, attrs in nh3.ALLOWED_ATTRIBUTES.items()}
+    for tag, attrs in _HEADING_ATTRIBUTES.items():
+        attributes[tag] = attributes.get(tag, set()) | attrs
+    return nh3.clean(html, attributes=attributes)
+
+
+def _nest_under_steps(headings: List[Dict[str, object]]) -> None:
+    """Indent headings that belong to a research step one level below the step heading."""
+    in_step = False
+    for heading in headings:
+        if heading["level"] == 2 and _STEP_ANCHOR_RE.match(heading["anchor"]):
+            in_step = True
+        elif in_step and heading["level"] > 1:
+            heading["level"] = min(6, heading["level"] + 1)
+
+
+def _flatten_toc(tokens: List[Dict[str, object]]) -> List[Dict[str, object]]:
+    headings: List[Dict[str, object]] = []
+    for token in tokens:
+        # heading names may contain inline markup; keep text only so templates can emit them as-is
+        headings.append({"level": token["level"], "text": nh3.clean(token["name"], tags=set()), "anchor": token["id"]})
+        headings.extend(_flatten_toc(token.get("children", [])))
+    return headings
+
+
+def render_report(text: str, page_chars: Optional[int] = None) -> Dict[str, object]:
+    """Render report markdown to sanitized HTML split into pages of whole sections.
+
+    In consolidated reports a section is one research step, and the headings inside a step
+    are nested under it in the heading index. Heading anchors come from the markdown toc extension, whose slugs match the links
+    create_consolidated_summary writes, so they are stable across renders. Returns
+    {"title", "headings": [{level, text, anchor, page}], "pages": [html, ...]}.
+    """
+    page_chars = page_chars or int(os.getenv("REPORT_PAGE_CHARS", "60000"))
+    md = markdown.Markdown(extensions=["extra", "sane_lists", "toc"])
+    html = _sanitize(md.convert(text))
+    headings = _flatten_toc(md.toc_tokens)
+    _nest_under_steps(headings)
+
+    # The generated plain-text table of contents is replaced by the heading index
+    html = "".join(s for s in _SECTION_SPLIT_RE.split(html) if not _TOC_SECTION_RE.match(s))
+    split_re = _STEP_SPLIT_RE if _STEP_SPLIT_RE.search(html) else _SECTION_SPLIT_RE
+    sections = [s for s in split_re.split(html) if s.strip()]
+
+    pages: List[str] = []
+    current = ""
+    for section in sections:
+        if current and len(current) + len(section) > page_chars:
+            pages.append(current)
+            current = ""
+        current += section
+    if current or not pages:
+        pages.append(current)
+
+    for heading in headings:
+        marker = f'id="{heading["anchor"]}"'
+        heading["page"] = next((i + 1 for i, page in enumerate(pages) if marker in page), None)
+    headings = [h for h in headings if h["page"] is not None]
+
+    title = next((h["text"] for h in headings if h["level"] == 1), None)
+    return {"title": title, "headings": headings, "pages": pages}
+
+
+class ReportCache:
+    """LRU cache of rendered reports keyed by (blob name, ETag).
+
+    The most recently used reports stay in memory; entries evicted from memory are
+    spilled to JSON files on disk and promoted back on their next hit. A new ETag
+    (the blob was overwritten) is simply a different key, so stale renders are never served.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, spill_dir: Optional[Path] = None, max_spill_files: Optional[int] = None):
+        self.max_entries = max_entries or int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "32"))
+        self.spill_dir = Path(spill_dir) if spill_dir else Path(os.getenv("TEMP", "/tmp")) / "report_cache"
+        self.max_spill_files = max_spill_files or int(os.getenv("REPORT_CACHE_MAX_SPILL_FILES", "500"))
+        self._entries: "OrderedDict[str, Dict[str, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, etag: str) -> str:
+        return hashlib.sha256(f"{name}\n{etag}".encode("utf-8")).hexdigest()
+
+    def get(self, name: str, etag: str) -> Optional[Dict[str, object]]:
+        key = self._key(name, etag)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        spill_path = self.spill_dir / f"{key}.json"
+        try:
+            entry = json.loads(spill_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        try:
+            spill_path.unlink()
+        except OSError:
+            pass
+        self._put(key, entry)
+        return entry
+
+    def put(self, name: str, etag: str, entry: Dict[str, object]) -> None:
+        self._put(self._key(name, etag), entry)
+
+    def _put(self, key: str, entry: Dict[str, object]) -> None:
+        evicted = []
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False))
+        for evicted_key, evicted_entry in evicted:
+            self._spill(evicted_key, evicted_entry)
+
+    def _spill(self, key: str, entry: Dict[str, object]) -> None:
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.spill_dir / f"{key}.json.tmp"
+            tmp_path.write_text(json.dumps(entry), encoding="utf-8")
+            tmp_path.replace(self.spill_dir / f"{key}.json")
+            spilled = sorted(self.spill_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for old in spilled[:max(0, len(spilled) - self.max_spill_files)]:
+                old.unlink()
+        except OSError as ex:
+            print(f"report cache: failed to spill entry to disk: {ex}")
+
+
+_default_cache: Optional[ReportCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_report_cache() -> ReportCache:
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ReportCache()
+        return _default_cache
+
+
+def page_etag(blob_etag: str, page: int) -> str:
+    """Weak ETag for one rendered page of a report version."""
+    return f'W/"{blob_etag.strip(chr(34))}-{page}"'
+
+
+def page_headers(tag: str) -> Dict[str, str]:
+    """Response headers making browsers revalidate a report page against its ETag on every view."""
+    return {'ETag': tag, 'Cache-Control': 'private, max-age=0, must-revalidate'}
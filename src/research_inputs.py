@@ -0,0 +1,65 @@
+import logging
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import BinaryIO, List
+
+logger = logging.getLogger(__name__)
+
+# Attachments are copied to disk in chunks of this size, logging progress as they go
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def max_upload_bytes() -> int:
+    """Largest accepted /start request body (RESEARCH_MAX_UPLOAD_MB, default 200)."""
+    return int(os.getenv("RESEARCH_MAX_UPLOAD_MB", "200")) * 1024 * 1024
+
+
+def get_inputs_dir(run_id: str) -> Path:
+    """Per-run folder holding the attachments handed to the researcher script."""
+    return Path(os.getenv("TEMP", "/tmp")) / "research_inputs" / run_id
+
+
+def safe_filename(filename: str) -> str:
+    name = _UNSAFE_FILENAME_RE.sub("_", Path(filename or "").name).strip("._")
+    return name or "attachment"
+
+
+def save_attachment(stream: BinaryIO, filename: str, dest_dir: Path) -> Path:
+    """Copy an uploaded file stream to dest_dir in chunks without holding it in memory."""
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    dest = dest_dir / safe_filename(filename)
+    stem, suffix, n = dest.stem, dest.suffix, 1
+    while dest.exists():
+        dest = dest_dir / f"{stem}_{n}{suffix}"
+        n += 1
+
+    copied = 0
+    next_report = 10 * COPY_CHUNK_SIZE
+    with open(dest, "wb") as out:
+        while True:
+            chunk = stream.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            out.write(chunk)
+            copied += len(chunk)
+            if copied >= next_report:
+                logger.info(f"Received {copied // (1024 * 1024)} MB of attachment '{dest.name}'")
+                next_report += 10 * COPY_CHUNK_SIZE
+    logger.info(f"Saved attachment '{dest.name}' ({copied} bytes)")
+    return dest
+
+
+def researcher_args(attachments: List[Path]) -> List[str]:
+    """Command-line arguments telling the researcher to read its prompt from stdin and attach files."""
+    args = ["--stdin"]
+    for path in attachments:
+        args.extend(["--attach", str(path)])
+    return args
+
+
+def cleanup_inputs(run_id: str) -> None:
+    shutil.rmtree(get_inputs_dir(run_id), ignore_errors=True)
@@ -0,0 +1,288 @@
+"""Run bookkeeping shared by the Flask (app.py) and ASGI (asgi_app.py) frontends.
+
+Everything here is synchronous and framework-free: the Flask app calls it directly,
+the ASGI app hands the blocking calls to asyncio.to_thread.
+"""
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from research_inputs import cleanup_inputs, get_inputs_dir, researcher_args, save_attachment
+from run_coordination import ACTIVE_STATUSES, public_record
+from usage_accounting import admission_mode, estimate_cost, get_usage_ledger, read_usage_file
+
+logger = logging.getLogger(__name__)
+
+SCRIPT_PATH = Path(__file__).resolve().parent / "split_deepresearcher_to_blob.py"
+
+# Fields of a run entry that only make sense inside the process executing it
+LOCAL_FIELDS = ("thread", "task", "process", "log")
+
+
+def get_research_python() -> str:
+    """Return a Python executable path to run the researcher script.
+
+    Priority:
+    1. RESEARCH_PYTHON env var (if exists)
+    2. sys.executable (Azure App Service)
+    """
+    env_path = os.getenv("RESEARCH_PYTHON")
+    if env_path and Path(env_path).exists():
+        logger.info(f"Using RESEARCH_PYTHON: {env_path}")
+        return env_path
+    logger.info(f"Using sys.executable: {sys.executable}")
+    return sys.executable
+
+
+def get_storage_connection_string() -> Optional[str]:
+    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+
+    if not conn_str and account_name and account_key:
+        conn_str = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
+    return conn_str
+
+
+def new_log_path(run_id: str) -> Path:
+    """Per-run log file under <TEMP>/research_logs (a reliable temp directory on App Service)."""
+    logs_dir = Path(os.getenv('TEMP', '/tmp')) / 'research_logs'
+    logs_dir.mkdir(parents=True, exist_ok=True)
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    return logs_dir / f"{run_id}_{timestamp}.log"
+
+
+def usage_path_for(log_path: Path) -> Path:
+    """File the researcher writes its token/tool-call usage to when the agent run ends."""
+    return log_path.with_suffix(".usage.json")
+
+
+def current_user(headers) -> str:
+    """User the run is accounted to: the App Service authentication principal, if any.
+
+    X-MS-CLIENT-PRINCIPAL-NAME is only trusted when App Service Authentication is enabled
+    (WEBSITE_AUTH_ENABLED), because the platform then replaces whatever the client sent.
+    Otherwise any caller could pick its own name, so all runs count as one 'anonymous' user.
+    """
+    if os.getenv("WEBSITE_AUTH_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return "anonymous"
+    return headers.get("X-MS-CLIENT-PRINCIPAL-NAME") or "anonymous"
+
+
+def admit_run(run_id: str, user: str) -> Tuple[Optional[str], bool]:
+    """Reserve usage budget for a new run.
+
+    Returns (queued_reason, rejected): queued_reason is None when the run was admitted;
+    rejected is True when it is over budget and USAGE_ADMISSION_MODE=reject. Ledger errors
+    (storage failures, a too contended shared ledger) are logged and raised.
+    """
+    try:
+        queued_reason = get_usage_ledger().try_admit(run_id, user)
+    except Exception as ex:
+        logger.error(f"Failed to admit run {run_id} against the usage ledger: {ex}")
+        raise
+    rejected = bool(queued_reason) and admission_mode() == "reject"
+    if rejected:
+        logger.warning(f"Rejected run for user {user}: {queued_reason}")
+    return queued_reason, rejected
+
+
+def readmit_queued_run(run_id: str, user: str) -> Optional[str]:
+    """Retry admission of a queued run; like try_admit, None means admitted.
+
+    A ledger error only means the run is not admitted yet, so it keeps waiting.
+    """
+    try:
+        return get_usage_ledger().try_admit(run_id, user)
+    except Exception as ex:
+        logger.warning(f"Failed to re-admit queued run {run_id}, retrying: {ex}")
+        return f"usage ledger unavailable: {ex}"
+
+
+def save_run_attachments(run_id: str, uploads) -> List[Path]:
+    """Copy uploaded files (objects with .stream and .filename) into the run's inputs folder.
+
+    On failure the run's budget reservation and partial inputs are dropped before re-raising.
+    """
+    attachments: List[Path] = []
+    try:
+        for upload in uploads:
+            attachments.append(save_attachment(upload.stream, upload.filename, get_inputs_dir(run_id)))
+    except Exception as ex:
+        logger.error(f"Failed to save attachments for run {run_id}: {ex}")
+        release_usage(run_id)
+        cleanup_inputs(run_id)
+        raise
+    return attachments
+
+
+def new_run_entry(log_path: Path, research_content: str, user: str, attachments: Optional[List[Path]] = None,
+                  queued_reason: Optional[str] = None) -> Dict[str, object]:
+    """In-memory entry for a queued run; the frontend adds its own thread/task handle."""
+    entry = {
+        "process": None,
+        "start": None,
+        "end": None,
+        "returncode": None,
+        "log": str(log_path),
+        "status": "queued",
+        # truncated version for status listings; the full prompt only goes to the researcher and the shared record
+        "research_content": research_content[:100] + "..." if research_content and len(research_content) > 100 else research_content,
+        "user": user,
+        "usage": None,
+        "attachments": [p.name for p in attachments or []],
+    }
+    if queued_reason:
+        entry["queued_reason"] = queued_reason
+    return entry
+
+
+def public_entry(meta: Dict[str, object], running: bool) -> Dict[str, object]:
+    """JSON-safe subset of a local run entry for /status."""
+    safe_meta = {k: v for k, v in meta.items() if k not in ("process", "thread", "task")}
+    safe_meta["running"] = running
+    return safe_meta
+
+
+def register_run(coordinator, run_id: str, meta: Dict[str, object], research_content: str):
+    """Publish a new run to the coordination store.
+
+    Returns its RunOwnership, or None when coordination is disabled or registration failed
+    (the run then executes locally only).
+    """
+    if coordinator is None:
+        return None
+    try:
+        record = {k: v for k, v in meta.items() if k not in LOCAL_FIELDS}
+        return coordinator.create_run(run_id, dict(record, prompt=research_content))
+    except Exception as ex:
+        logger.warning(f"Failed to register run {run_id} with coordination store: {ex}")
+        return None
+
+
+def publish_run(ownership, log_path: Path, final: bool = False, **fields) -> None:
+    """Best-effort update of the shared run record; coordination failures never fail the run."""
+    if ownership is None:
+        return
+    try:
+        if final:
+            ownership.finish(log_path, **fields)
+        else:
+            ownership.heartbeat(log_path, **fields)
+    except Exception as ex:
+        logger.warning(f"Failed to publish run {ownership.run_id} to coordination store: {ex}")
+
+
+def log_header(run_id: str, python_exe: str, script_path: Path, research_content: Optional[str], attachments: Optional[List[Path]]) -> str:
+    return (
+        f"Starting research run {run_id} at {datetime.now(timezone.utc).isoformat()}\n"
+        f"Python executable: {python_exe}\n"
+        f"Script path: {script_path}\n"
+        f"Working directory: {script_path.parent}\n"
+        f"Research content length: {len(research_content) if research_content else 0}\n"
+        f"Attachments: {len(attachments or [])}\n"
+        + "=" * 80 + "\n"
+    )
+
+
+def researcher_command(python_exe: str, script_path: Path, attachments: Optional[List[Path]]) -> List[str]:
+    return [python_exe, "-u", str(script_path)] + researcher_args(attachments or [])
+
+
+def researcher_env(usage_path: Path) -> Dict[str, str]:
+    env = os.environ.copy()
+    env["PYTHONUNBUFFERED"] = "1"
+    env["PYTHONIOENCODING"] = "utf-8"
+    env["RESEARCH_USAGE_FILE"] = str(usage_path)
+    return env
+
+
+def settle_usage(run_id: str, user: str, usage_path: Path) -> Optional[Dict[str, object]]:
+    """Record the usage the researcher reported against the ledger, or release the run's reservation."""
+    usage = read_usage_file(usage_path)
+    if usage is None:
+        release_usage(run_id)
+        return None
+    usage["estimated_cost"] = estimate_cost(usage)
+    try:
+        get_usage_ledger().record(run_id, user, usage)
+    except Exception as ex:
+        logger.error(f"Failed to record usage of run {run_id}: {ex}")
+    return usage
+
+
+def release_usage(run_id: str) -> None:
+    """Best-effort release of a run's budget reservation (an unreleased one expires on its own)."""
+    try:
+        get_usage_ledger().release(run_id)
+    except Exception as ex:
+        logger.warning(f"Failed to release usage reservation of run {run_id}: {ex}")
+
+
+def remote_status(coordinator, run_id: str) -> Optional[Dict[str, object]]:
+    """/status payload for a run owned by another instance, from its shared record."""
+    record = None
+    if coordinator:
+        try:
+            record = coordinator.get_run(run_id)
+        except Exception as ex:
+            logger.warning(f"Failed to read run {run_id} from coordination store: {ex}")
+    if not record:
+        return None
+    safe_meta = public_record(record)
+    safe_meta["running"] = record.get("status") in ACTIVE_STATUSES
+    return safe_meta
+
+
+def remote_log_range(coordinator, run_id: str, start: int, max_bytes: int) -> Optional[Tuple[bytes, int]]:
+    """(data, size) of a run's shared log blob read from start (negative = tail), or None if unknown."""
+    if not coordinator:
+        return None
+    try:
+        return coordinator.read_log_range(run_id, start, max_bytes)
+    except Exception as ex:
+        logger.warning(f"Failed to read log of run {run_id} from coordination store: {ex}")
+        return None
+
+
+def is_expired(meta: Dict[str, object], now: datetime, max_age_seconds: int) -> bool:
+    """True for a finished run whose end (or start) is older than max_age_seconds."""
+    if meta.get("status") in ACTIVE_STATUSES:
+        return False
+    ts_str = meta.get("end") or meta.get("start")
+    if not ts_str:
+        return False
+    try:
+        return (now - datetime.fromisoformat(ts_str)).total_seconds() > max_age_seconds
+    except Exception:
+        return False
+
+
+def remove_run_files(coordinator, run_id: str, meta: Dict[str, object]) -> None:
+    """Delete a finished run's local log and usage file and its shared record."""
+    try:
+        if meta.get("log"):
+            logp = Path(meta["log"])
+            logp.unlink(missing_ok=True)
+            usage_path_for(logp).unlink(missing_ok=True)
+    except Exception as e:
+        logger.warning(f"cleanup: failed to delete log for {run_id}: {e}")
+    if coordinator:
+        try:
+            coordinator.delete_run(run_id)
+        except Exception as e:
+            logger.warning(f"cleanup: failed to delete shared record for {run_id}: {e}")
+
+
+def takeover_entry(ownership, log_path: Path) -> Dict[str, object]:
+    """In-memory entry for a run taken over from another instance."""
+    record = ownership.record
+    if record.get("attachments"):
+        # attachments only exist on the instance that received them
+        logger.warning(f"Run {ownership.run_id} is restarted without its {len(record['attachments'])} attachments")
+    entry = new_run_entry(log_path, None, record.get("user"))
+    entry["research_content"] = record.get("research_content")
+    return entry
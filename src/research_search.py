@@ -0,0 +1,465 @@
+import argparse
+import codecs
+import heapq
+import math
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# BM25 tuning parameters (standard defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Passages are built from markdown paragraphs; short paragraphs are merged so that
+# headings and bullet fragments are searchable together with the text they introduce.
+PASSAGE_MIN_CHARS = 200
+PASSAGE_MAX_CHARS = 1200
+
+SNIPPET_WORDS = 40
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+_STEP_RE = re.compile(r"research_step_(\d+)_")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in into is it its of on or "
+    "that the their there these this to was were will with".split()
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    name TEXT PRIMARY KEY,
+    run_folder TEXT,
+    kind TEXT,
+    step INTEGER,
+    indexed_at TEXT
+);
+CREATE TABLE IF NOT EXISTS passages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    blob_name TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS passages_blob ON passages(blob_name);
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    passage_id INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, passage_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_passage ON postings(passage_id);
+CREATE TABLE IF NOT EXISTS stats (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+def get_index_path() -> Path:
+    """Return the on-disk location of the search index.
+
+    RESEARCH_SEARCH_INDEX_PATH overrides the default of <TEMP>/research_index/index.sqlite3,
+    which is shared by the web app and the researcher script running on the same instance.
+    """
+    env_path = os.getenv("RESEARCH_SEARCH_INDEX_PATH")
+    if env_path:
+        return Path(env_path)
+    return Path(os.getenv("TEMP", "/tmp")) / "research_index" / "index.sqlite3"
+
+
+def search_enabled() -> bool:
+    return os.getenv("RESEARCH_SEARCH_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case word tokenizer used for both indexing and queries."""
+    return [t for t in _WORD_RE.findall(text.lower()) if t not in STOPWORDS and (len(t) > 1 or t.isdigit())]
+
+
+def describe_blob(blob_name: str) -> Dict[str, Optional[object]]:
+    """Derive run folder, artifact kind and step number from a research blob name."""
+    run_folder, _, filename = blob_name.rpartition("/")
+    step_match = _STEP_RE.search(filename)
+    if step_match:
+        kind = "intermediate"
+    elif filename.startswith("consolidated_research_summary"):
+        kind = "consolidated"
+    elif filename.startswith("final_research_summary"):
+        kind = "final"
+    else:
+        kind = "other"
+    return {
+        "run_folder": run_folder or None,
+        "kind": kind,
+        "step": int(step_match.group(1)) if step_match else None,
+    }
+
+
+def iter_passages(chunks: Iterable[str]) -> Iterator[str]:
+    """Split a stream of text chunks into passages without materialising the whole document."""
+    pending = ""
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        paragraphs = _PARAGRAPH_SPLIT_RE.split(buffer)
+        # The last paragraph may continue in the next chunk
+        buffer = paragraphs.pop()
+        for paragraph in paragraphs:
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            pending = f"{pending}\n\n{paragraph}" if pending else paragraph
+            if len(pending) >= PASSAGE_MIN_CHARS:
+                yield from _split_long(pending)
+                pending = ""
+    tail = buffer.strip()
+    if tail:
+        pending = f"{pending}\n\n{tail}" if pending else tail
+    if pending:
+        yield from _split_long(pending)
+
+
+def _split_long(passage: str) -> Iterator[str]:
+    while len(passage) > PASSAGE_MAX_CHARS:
+        cut = passage.rfind(" ", 0, PASSAGE_MAX_CHARS)
+        if cut <= 0:
+            cut = PASSAGE_MAX_CHARS
+        yield passage[:cut].strip()
+        passage = passage[cut:].strip()
+    if passage:
+        yield passage
+
+
+def iter_decoded(byte_chunks: Iterable[bytes], encoding: str = "utf-8") -> Iterator[str]:
+    """Incrementally decode byte chunks so multi-byte characters may straddle chunk boundaries."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    text = decoder.decode(b"", final=True)
+    if text:
+        yield text
+
+
+def make_snippet(text: str, terms: Iterable[str], window: int = SNIPPET_WORDS) -> str:
+    """Return the window of `window` words with the most query-term hits, with hits in **bold**."""
+    term_set = set(terms)
+    words = list(_WORD_RE.finditer(text))
+    if not words:
+        return text[:300]
+    hits = [1 if m.group(0).lower() in term_set else 0 for m in words]
+
+    best_start, best_score = 0, -1
+    score = sum(hits[:window])
+    for start in range(0, max(1, len(words) - window + 1)):
+        if start > 0:
+            score += (hits[start + window - 1] if start + window - 1 < len(hits) else 0) - hits[start - 1]
+        if score > best_score:
+            best_start, best_score = start, score
+
+    end = min(len(words), best_start + window)
+    char_start = words[best_start].start()
+    char_end = words[end - 1].end()
+
+    out: List[str] = []
+    pos = char_start
+    for m in words[best_start:end]:
+        out.append(text[pos:m.start()])
+        out.append(f"**{m.group(0)}**" if m.group(0).lower() in term_set else m.group(0))
+        pos = m.end()
+    snippet = " ".join("".join(out).split())
+    if char_start > 0:
+        snippet = "… " + snippet
+    if char_end < len(text):
+        snippet = snippet + " …"
+    return snippet
+
+
+class SearchIndex:
+    """Inverted index over research markdown stored in a local SQLite file.
+
+    Each blob is split into passages; postings map terms to passages with their term
+    frequency and queries are ranked with BM25. SQLite provides cross-process locking,
+    so the researcher subprocess can index while the web app serves queries.
+
+    The file is local to one instance: it holds what this instance's researcher runs
+    uploaded plus whatever --rebuild loaded, not the runs of other instances.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else get_index_path()
+        self._write_lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._initialized = True
+        return conn
+
+    @staticmethod
+    def _bump_stats(conn: sqlite3.Connection, passages: int, length: int) -> None:
+        for key, delta in (("passages", passages), ("total_length", length)):
+            conn.execute(
+                "INSERT INTO stats(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+                (key, delta),
+            )
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, blob_name: str) -> None:
+        row = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM passages WHERE blob_name = ?", (blob_name,)).fetchone()
+        if row[0]:
+            conn.execute("DELETE FROM postings WHERE passage_id IN (SELECT id FROM passages WHERE blob_name = ?)", (blob_name,))
+            conn.execute("DELETE FROM passages WHERE blob_name = ?", (blob_name,))
+            SearchIndex._bump_stats(conn, -row[0], -row[1])
+        conn.execute("DELETE FROM blobs WHERE name = ?", (blob_name,))
+
+    def index_text(self, blob_name: str, content: str) -> int:
+        return self.index_stream(blob_name, [content])
+
+    def index_stream(self, blob_name: str, chunks: Iterable[str]) -> int:
+        """(Re)index one blob from an iterable of text chunks. Returns the number of passages."""
+        meta = describe_blob(blob_name)
+        count = 0
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    self._remove(conn, blob_name)
+                    conn.execute(
+                        "INSERT INTO blobs(name, run_folder, kind, step, indexed_at) VALUES (?, ?, ?, ?, ?)",
+                        (blob_name, meta["run_folder"], meta["kind"], meta["step"], datetime.now(timezone.utc).isoformat()),
+                    )
+                    total_length = 0
+                    for ordinal, passage in enumerate(iter_passages(chunks)):
+                        tokens = tokenize(passage)
+                        if not tokens:
+                            continue
+                        cur = conn.execute(
+                            "INSERT INTO passages(blob_name, ordinal, length, text) VALUES (?, ?, ?, ?)",
+                            (blob_name, ordinal, len(tokens), passage),
+                        )
+                        tf: Dict[str, int] = {}
+                        for token in tokens:
+                            tf[token] = tf.get(token, 0) + 1
+                        conn.executemany(
+                            "INSERT INTO postings(term, passage_id, tf) VALUES (?, ?, ?)",
+                            [(term, cur.lastrowid, n) for term, n in tf.items()],
+                        )
+                        total_length += len(tokens)
+                        count += 1
+                    self._bump_stats(conn, count, total_length)
+            finally:
+                conn.close()
+        return count
+
+    def remove(self, blob_name: str) -> None:
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    self._remove(conn, blob_name)
+            finally:
+                conn.close()
+
+    def remove_prefix(self, prefix: str) -> None:
+        """Remove every blob whose name starts with prefix (e.g. one run folder)."""
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    names = [row[0] for row in conn.execute("SELECT name FROM blobs WHERE substr(name, 1, ?) = ?", (len(prefix), prefix))]
+                    for name in names:
+                        self._remove(conn, name)
+            finally:
+                conn.close()
+
+    def clear(self) -> None:
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    for table in ("postings", "passages", "blobs", "stats"):
+                        conn.execute(f"DELETE FROM {table}")
+            finally:
+                conn.close()
+
+    def search(self, query: str, limit: int = 10, run_folder: Optional[str] = None) -> Dict[str, object]:
+        """Rank passages for `query` with BM25 and return matching passages grouped by run."""
+        started = time.perf_counter()
+        terms = list(dict.fromkeys(tokenize(query)))
+        limit = max(1, min(limit, 100))
+        result: Dict[str, object] = {"query": query, "results": [], "runs": []}
+        if not terms:
+            result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+            return result
+
+        conn = self._connect()
+        try:
+            stats = dict(conn.execute("SELECT key, value FROM stats").fetchall())
+            n_passages = stats.get("passages", 0)
+            avg_length = (stats.get("total_length", 0) / n_passages) if n_passages else 0.0
+
+            scores: Dict[int, float] = {}
+            for term in terms:
+                # idf uses collection-wide document frequency; a run_folder scope only restricts candidates
+                df = conn.execute("SELECT COUNT(*) FROM postings WHERE term = ?", (term,)).fetchone()[0]
+                if not df:
+                    continue
+                if run_folder:
+                    rows = conn.execute(
+                        "SELECT p.passage_id, p.tf, s.length FROM postings p JOIN passages s ON s.id = p.passage_id "
+                        "JOIN blobs b ON b.name = s.blob_name WHERE p.term = ? AND b.run_folder = ?",
+                        (term, run_folder),
+                    ).fetchall()
+                else:
+                    rows = conn.execute(
+                        "SELECT p.passage_id, p.tf, s.length FROM postings p JOIN passages s ON s.id = p.passage_id WHERE p.term = ?",
+                        (term,),
+                    ).fetchall()
+                idf = math.log(1 + (n_passages - df + 0.5) / (df + 0.5))
+                for passage_id, tf, length in rows:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * (length / avg_length if avg_length else 1))
+                    scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+            candidates = heapq.nlargest(limit, scores.items(), key=lambda kv: kv[1])
+
+            results: List[Dict[str, object]] = []
+            runs: Dict[str, Dict[str, object]] = {}
+            for passage_id, score in candidates:
+                row = conn.execute(
+                    "SELECT s.blob_name, s.ordinal, s.text, b.run_folder, b.kind, b.step "
+                    "FROM passages s JOIN blobs b ON b.name = s.blob_name WHERE s.id = ?",
+                    (passage_id,),
+                ).fetchone()
+                if not row:
+                    continue
+                blob_name, ordinal, text, folder, kind, step = row
+                results.append({
+                    "blob": blob_name,
+                    "run_folder": folder,
+                    "kind": kind,
+                    "step": step,
+                    "passage": ordinal,
+                    "score": round(score, 4),
+                    "snippet": make_snippet(text, terms),
+                })
+                run = runs.setdefault(folder or "", {"run_folder": folder, "score": 0.0, "hits": 0})
+                run["score"] = max(run["score"], round(score, 4))
+                run["hits"] += 1
+        finally:
+            conn.close()
+
+        result["results"] = results
+        result["runs"] = sorted(runs.values(), key=lambda r: r["score"], reverse=True)
+        result["took_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        return result
+
+
+_default_index: Optional[SearchIndex] = None
+_default_index_lock = threading.Lock()
+
+
+def get_search_index() -> SearchIndex:
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = SearchIndex()
+        return _default_index
+
+
+def index_blob_text(blob_name: str, content: str) -> None:
+    """Best-effort hook used after a research artifact is uploaded; never raises."""
+    if not search_enabled() or not blob_name.endswith(".md"):
+        return
+    try:
+        get_search_index().index_text(blob_name, content)
+    except Exception as ex:
+        print(f"Failed to index '{blob_name}' for search: {ex}")
+
+
+def iter_blob_text(container_client, blob_name: str) -> Iterator[str]:
+    """Stream a blob's text chunk by chunk, reassembling chunked manifests."""
+    from chunk_store import open_blob_stream
+
+    byte_chunks, _ = open_blob_stream(container_client, blob_name)
+    yield from iter_decoded(byte_chunks)
+
+
+def rebuild_from_container(container_client, prefix: Optional[str] = None) -> Tuple[int, int]:
+    """Rebuild the index by streaming every markdown blob in the container, one blob at a time.
+
+    With a prefix only the blobs under it are dropped and re-indexed; the rest of the index is kept.
+    Returns (blobs_indexed, passages_indexed).
+    """
+    index = get_search_index()
+    if prefix:
+        index.remove_prefix(prefix)
+    else:
+        index.clear()
+    blobs = passages = 0
+    for blob in container_client.list_blobs(name_starts_with=prefix):
+        if not blob.name.endswith(".md"):
+            continue
+        try:
+            passages += index.index_stream(blob.name, iter_blob_text(container_client, blob.name))
+            blobs += 1
+        except Exception as ex:
+            print(f"Failed to index '{blob.name}': {ex}")
+    return blobs, passages
+
+
+def _get_container_client():
+    from azure.storage.blob import BlobServiceClient
+
+    conn_str = os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+
+    if not conn_str:
+        if account_name and account_key:
+            conn_str = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
+        else:
+            return None
+    client = BlobServiceClient.from_connection_string(conn_str)
+    return client.get_container_client(os.getenv("AZURE_STORAGE_CONTAINER_NAME", "research-summaries"))
+
+
+def main() -> None:
+    """Rebuild the index from blob storage (--rebuild) or run a query from the command line."""
+    parser = argparse.ArgumentParser(description="Search generated research reports.")
+    parser.add_argument("query", nargs="*", help="search terms")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index from the storage container")
+    parser.add_argument("--prefix", help="only rebuild blobs under this run folder")
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args()
+
+    if args.rebuild:
+        container_client = _get_container_client()
+        if container_client is None:
+            print("Azure Storage credentials not found in environment.")
+            sys.exit(1)
+        blobs, passages = rebuild_from_container(container_client, prefix=args.prefix)
+        print(f"Indexed {passages} passages from {blobs} blobs into {get_index_path()}")
+
+    if args.query:
+        result = get_search_index().search(" ".join(args.query), limit=args.limit)
+        for hit in result["results"]:
+            print(f"{hit['score']:8.3f}  {hit['blob']}#{hit['passage']}\n          {hit['snippet']}")
+        print(f"{len(result['results'])} results in {result['took_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+import json
+import logging
+import os
+import socket
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from azure.core.exceptions import AzureError, HttpResponseError, ResourceExistsError, ResourceNotFoundError
+from azure.storage.blob import BlobServiceClient as SyncBlobServiceClient
+from azure.storage.blob import ContentSettings
+
+logger = logging.getLogger(__name__)
+
+RECORDS_PREFIX = "runs"
+# Append blocks are limited to 4 MiB each
+MAX_APPEND_BLOCK = 4 * 1024 * 1024
+ACTIVE_STATUSES = ("queued", "running")
+# Status of a record placeholder that is leased but not written yet
+CREATING_STATUS = "creating"
+# Storage error codes meaning the lease now belongs to someone else (or to no one)
+LEASE_LOST_CODES = ("LeaseIdMismatch", "LeaseLost", "LeaseNotPresent", "LeaseIsBroken")
+
+
+def _lease_lost(ex: HttpResponseError) -> bool:
+    return ex.status_code == 409 and str(getattr(ex, "error_code", "") or "").startswith(LEASE_LOST_CODES)
+
+
+def public_record(record: Dict[str, object]) -> Dict[str, object]:
+    """Record fields safe to return from /status (drops the full prompt)."""
+    return {k: v for k, v in record.items() if k != "prompt"}
+
+
+def coordination_enabled() -> bool:
+    return os.getenv("RUN_COORDINATION_ENABLED", "false").lower() in ("1", "true", "yes")
+
+
+def get_instance_id() -> str:
+    """Identify this instance; App Service sets WEBSITE_INSTANCE_ID on every scaled-out instance."""
+    return os.getenv("WEBSITE_INSTANCE_ID") or f"{socket.gethostname()}-{os.getpid()}"
+
+
+class RunOwnership:
+    """Lease-backed ownership of a single run held by the instance executing it.
+
+    The owner periodically calls heartbeat(), which renews the lease, ships new log output
+    to the shared log blob and refreshes the run record. If the lease cannot be renewed
+    another instance may already have taken the run over, so the owner must stop.
+    """
+
+    def __init__(self, coordinator: "RunCoordinator", run_id: str, lease, record: Dict[str, object]):
+        self.coordinator = coordinator
+        self.run_id = run_id
+        self.lease = lease
+        self.record = record
+        self.log_offset = 0
+        self.lost = False
+        self.renewed_at = datetime.now(timezone.utc)
+
+    def update(self, **fields) -> None:
+        self.record.update(fields)
+        self.record["heartbeat"] = datetime.now(timezone.utc).isoformat()
+        self.coordinator._write_record(self.run_id, self.record, lease=self.lease)
+
+    def ship_log(self, log_path: Path) -> None:
+        """Append log output written since the last call to the shared log blob."""
+        try:
+            with open(log_path, "rb") as f:
+                f.seek(self.log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        if data:
+            self.coordinator.append_log(self.run_id, data)
+            self.log_offset += len(data)
+
+    def heartbeat(self, log_path: Optional[Path] = None, **fields) -> bool:
+        """Renew the lease and publish progress. Returns False if ownership was lost.
+
+        Ownership is lost when storage reports a lease conflict, or when renewals keep
+        failing until the lease has expired. Other failures (throttling, timeouts, network
+        errors) are retried on the next heartbeat while the lease is still valid.
+        """
+        try:
+            self.lease.renew()
+            self.renewed_at = datetime.now(timezone.utc)
+        except AzureError as ex:
+            if isinstance(ex, HttpResponseError) and _lease_lost(ex):
+                logger.error(f"Lost lease on run {self.run_id}: {ex}")
+                self.lost = True
+                return False
+            if (datetime.now(timezone.utc) - self.renewed_at).total_seconds() >= self.coordinator.lease_seconds:
+                logger.error(f"Lease on run {self.run_id} expired after failed renewals: {ex}")
+                self.lost = True
+                return False
+            logger.warning(f"Failed to renew lease on run {self.run_id}, retrying: {ex}")
+            return True
+        try:
+            if log_path:
+                self.ship_log(log_path)
+            self.update(**fields)
+        except Exception as ex:
+            # the lease is still ours; a failed publish is retried on the next heartbeat
+            logger.warning(f"Heartbeat publish failed for run {self.run_id}: {ex}")
+        return True
+
+    def finish(self, log_path: Optional[Path] = None, **fields) -> None:
+        if self.lost:
+            # the record now belongs to whichever instance took the run over
+            return
+        try:
+            if log_path:
+                self.ship_log(log_path)
+            self.update(**fields)
+        finally:
+            try:
+                self.lease.release()
+            except HttpResponseError as ex:
+                logger.warning(f"Failed to release lease on run {self.run_id}: {ex}")
+
+
+class RunCoordinator:
+    """Shares run records and logs between app instances through blob storage.
+
+    Each run has a JSON record blob (runs/<run_id>.json) leased by the instance executing
+    it and an append blob with its log (runs/<run_id>.log). Any instance can serve status
+    and logs from these blobs; a record left in an active state whose lease has expired
+    belongs to a dead instance and can be taken over by another one.
+
+    The record's status and heartbeat are mirrored into blob metadata, so sweeps can skip
+    finished and live runs from the listing alone. Finished records are deleted by their
+    owner's cleanup, or by any sweeper once they are older than RUN_RECORD_RETENTION_HOURS.
+    """
+
+    def __init__(self, container_client, instance_id: Optional[str] = None, lease_seconds: Optional[int] = None,
+                 retention_hours: Optional[int] = None):
+        self.container_client = container_client
+        self.instance_id = instance_id or get_instance_id()
+        # blob leases must be between 15 and 60 seconds (or infinite)
+        self.lease_seconds = lease_seconds or int(os.getenv("RUN_LEASE_SECONDS", "60"))
+        self.retention_hours = retention_hours or int(os.getenv("RUN_RECORD_RETENTION_HOURS", "48"))
+        self._container_ready = False
+
+    def _ensure_container(self) -> None:
+        if self._container_ready:
+            return
+        try:
+            self.container_client.create_container()
+        except ResourceExistsError:
+            pass
+        self._container_ready = True
+
+    def _record_client(self, run_id: str):
+        return self.container_client.get_blob_client(f"{RECORDS_PREFIX}/{run_id}.json")
+
+    def _log_client(self, run_id: str):
+        return self.container_client.get_blob_client(f"{RECORDS_PREFIX}/{run_id}.log")
+
+    def _write_record(self, run_id: str, record: Dict[str, object], lease=None) -> None:
+        self._record_client(run_id).upload_blob(
+            json.dumps(record).encode("utf-8"),
+            overwrite=True,
+            lease=lease,
+            content_settings=ContentSettings(content_type="application/json"),
+            metadata={"status": str(record.get("status")), "heartbeat": str(record.get("heartbeat"))},
+        )
+
+    def create_run(self, run_id: str, record: Dict[str, object]) -> RunOwnership:
+        """Take the ownership lease on a new run, then publish its record and log.
+
+        The lease is acquired on an empty placeholder before the record is written, so no
+        other instance ever sees the run unleased. If any step fails the placeholder and
+        log are deleted again and the error is raised; the caller then runs it locally only.
+        """
+        self._ensure_container()
+        record = dict(record, owner=self.instance_id, attempt=1, heartbeat=datetime.now(timezone.utc).isoformat())
+        record_client = self._record_client(run_id)
+        record_client.upload_blob(b"", overwrite=False, metadata={"status": CREATING_STATUS})
+        lease = None
+        try:
+            lease = record_client.acquire_lease(lease_duration=self.lease_seconds)
+            self._log_client(run_id).create_append_blob(content_settings=ContentSettings(content_type="text/plain; charset=utf-8"))
+            self._write_record(run_id, record, lease=lease)
+        except Exception:
+            self._discard(run_id, lease)
+            raise
+        return RunOwnership(self, run_id, lease, record)
+
+    def _discard(self, run_id: str, lease=None) -> None:
+        """Best-effort removal of a run that could not be created."""
+        for client, blob_lease in ((self._record_client(run_id), lease), (self._log_client(run_id), None)):
+            try:
+                client.delete_blob(lease=blob_lease)
+            except AzureError as ex:
+                if not isinstance(ex, ResourceNotFoundError):
+                    logger.warning(f"Failed to discard {client.blob_name}: {ex}")
+
+    def get_run(self, run_id: str) -> Optional[Dict[str, object]]:
+        try:
+            data = self._record_client(run_id).download_blob().readall()
+        except ResourceNotFoundError:
+            return None
+        # an empty placeholder belongs to a run still being created
+        return json.loads(data) if data else None
+
+    def delete_run(self, run_id: str) -> None:
+        for client in (self._record_client(run_id), self._log_client(run_id)):
+            try:
+                client.delete_blob()
+            except ResourceNotFoundError:
+                pass
+
+    def append_log(self, run_id: str, data: bytes) -> None:
+        log_client = self._log_client(run_id)
+        for start in range(0, len(data), MAX_APPEND_BLOCK):
+            log_client.append_block(data[start:start + MAX_APPEND_BLOCK])
+
+    def read_log_range(self, run_id: str, start: int, max_bytes: int) -> Optional[Tuple[bytes, int]]:
+        """Return (data, size) of the shared log read from start (negative = tail), or None if there is no log."""
+        log_client = self._log_client(run_id)
+        try:
+            size = log_client.get_blob_properties().size
+            if start < 0:
+                start = max(0, size + start)
+            length = min(max_bytes, size - start)
+            if length <= 0:
+                return b"", size
+            return log_client.download_blob(offset=start, length=length).readall(), size
+        except ResourceNotFoundError:
+            return None
+
+    def read_log_tail(self, run_id: str, tail_bytes: int) -> Optional[bytes]:
+        result = self.read_log_range(run_id, -tail_bytes, tail_bytes)
+        return result[0] if result is not None else None
+
+    def _heartbeat_expired(self, record: Dict[str, object]) -> bool:
+        try:
+            heartbeat = datetime.fromisoformat(str(record.get("heartbeat")))
+        except ValueError:
+            return True
+        return (datetime.now(timezone.utc) - heartbeat).total_seconds() > self.lease_seconds
+
+    def _age_seconds(self, blob) -> float:
+        if not blob.last_modified:
+            return 0.0
+        return (datetime.now(timezone.utc) - blob.last_modified).total_seconds()
+
+    def take_over_stale_runs(self) -> List[RunOwnership]:
+        """Acquire the lease of every active run whose owner stopped heartbeating.
+
+        Acquiring only succeeds once the previous lease expired or was released, so at most
+        one instance wins each run. The same listing also deletes orphaned blobs: finished
+        records and logs older than RUN_RECORD_RETENTION_HOURS (their owner may be gone
+        before its own cleanup ran) and placeholders of runs whose creation never completed.
+        """
+        self._ensure_container()
+        taken: List[RunOwnership] = []
+        retention_seconds = self.retention_hours * 3600
+        blobs = list(self.container_client.list_blobs(name_starts_with=f"{RECORDS_PREFIX}/", include=["metadata"]))
+        record_names = {blob.name for blob in blobs if blob.name.endswith(".json")}
+        for blob in blobs:
+            if blob.lease.status == "locked":
+                continue
+            if not blob.name.endswith(".json"):
+                if blob.name[:-len(".log")] + ".json" not in record_names and self._age_seconds(blob) > retention_seconds:
+                    self._delete_orphan(blob.name)
+                continue
+            run_id = Path(blob.name).stem
+            status = (blob.metadata or {}).get("status")
+            if status == CREATING_STATUS:
+                if self._age_seconds(blob) > self.lease_seconds:
+                    self._discard(run_id)
+                continue
+            if status is not None and status not in ACTIVE_STATUSES:
+                if self._age_seconds(blob) > retention_seconds:
+                    self._discard(run_id)
+                continue
+            if status is None:
+                # records written before status was kept in metadata
+                record = self.get_run(run_id)
+                if not record or record.get("status") not in ACTIVE_STATUSES:
+                    if self._age_seconds(blob) > retention_seconds:
+                        self._discard(run_id)
+                    continue
+            elif not self._heartbeat_expired(blob.metadata):
+                continue
+            record_client = self._record_client(run_id)
+            try:
+                lease = record_client.acquire_lease(lease_duration=self.lease_seconds)
+            except HttpResponseError:
+                continue  # another instance got there first
+            try:
+                record = json.loads(record_client.download_blob(lease=lease).readall())
+                if record.get("status") not in ACTIVE_STATUSES:
+                    lease.release()
+                    continue
+                previous_owner = record.get("owner")
+                ownership = RunOwnership(self, run_id, lease, record)
+                ownership.update(owner=self.instance_id, attempt=int(record.get("attempt", 1)) + 1, status="queued")
+                self.append_log(run_id, f"\nRun taken over by instance {self.instance_id} from {previous_owner}; restarting.\n".encode("utf-8"))
+                logger.info(f"Took over stale run {run_id} from {previous_owner}")
+                taken.append(ownership)
+            except Exception as ex:
+                logger.error(f"Failed to take over run {run_id}: {ex}")
+                try:
+                    lease.release()
+                except HttpResponseError:
+                    pass
+        return taken
+
+    def _delete_orphan(self, blob_name: str) -> None:
+        try:
+            self.container_client.get_blob_client(blob_name).delete_blob()
+        except AzureError as ex:
+            if not isinstance(ex, ResourceNotFoundError):
+                logger.warning(f"Failed to delete orphaned {blob_name}: {ex}")
+
+
+def get_coordination_container_client():
+    """Container client of the coordination store, or None when coordination is disabled.
+
+    RUN_COORDINATION_CONNECTION_STRING may point at a separate account, e.g.
+    'UseDevelopmentStorage=true' for a local Azurite emulator; it defaults to the
+    account used for research summaries.
+    """
+    if not coordination_enabled():
+        return None
+    conn_str = os.getenv("RUN_COORDINATION_CONNECTION_STRING") or os.getenv("AZURE_STORAGE_CONNECTION_STRING")
+    account_name = os.getenv("AZURE_STORAGE_ACCOUNT_NAME")
+    account_key = os.getenv("AZURE_STORAGE_ACCOUNT_KEY")
+
+    if not conn_str:
+        if account_name and account_key:
+            conn_str = f"DefaultEndpointsProtocol=https;AccountName={account_name};AccountKey={account_key};EndpointSuffix=core.windows.net"
+        else:
+            logger.warning("RUN_COORDINATION_ENABLED is set but no storage credentials were found")
+            return None
+    client = SyncBlobServiceClient.from_connection_string(conn_str)
+    return client.get_container_client(os.getenv("RUN_COORDINATION_CONTAINER_NAME", "research-runs"))
+
+
+def get_run_coordinator() -> Optional[RunCoordinator]:
+    """Build a coordinator from the environment, or None when coordination is disabled."""
+    container_client = get_coordination_container_client()
+    return RunCoordinator(container_client) if container_client is not None else None
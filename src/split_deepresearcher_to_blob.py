@@ -1,14 +1,17 @@
+import argparse
 import asyncio
+import io
+import json
 import os
 import sys
 from datetime import datetime, timezone
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, List, Tuple
 from dotenv import load_dotenv
 from pathlib import Path
 
 from azure.ai.projects.aio import AIProjectClient
 from azure.ai.agents.aio import AgentsClient
-from azure.ai.agents.models import DeepResearchTool, MessageRole, ThreadMessage
+from azure.ai.agents.models import DeepResearchTool, FilePurpose, FileSearchTool, MessageRole, ThreadMessage
 from azure.identity.aio import DefaultAzureCredential
 
 # Async blob client
@@ -16,6 +19,9 @@ from azure.storage.blob.aio import BlobServiceClient
 from azure.storage.blob import ContentSettings
 from azure.core.exceptions import ResourceExistsError
 
+from chunk_store import chunked_storage_enabled, upload_chunked
+from research_search import index_blob_text
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -74,11 +80,22 @@ async def upload_text_to_blob(content: str, container_name: str, blob_name: str)
             # Some services may raise different exceptions when container exists; ignore common 'already exists' errors
             pass
 
-        blob_client = container_client.get_blob_client(blob_name)
         data = content.encode("utf-8")
-        content_settings = ContentSettings(content_type="text/markdown; charset=utf-8")
-        await blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
-        print(f"Uploaded '{blob_name}' to container '{container_name}'.")
+        if chunked_storage_enabled():
+            # Store only chunks not already present in the run/container plus a small manifest
+            stats = await upload_chunked(container_client, blob_name, data, content_type="text/markdown; charset=utf-8")
+            print(
+                f"Uploaded '{blob_name}' to container '{container_name}' as {stats['chunks']} chunks "
+                f"({stats['new_chunks']} new, {stats['bytes_uploaded']} of {stats['size']} bytes sent)."
+            )
+        else:
+            blob_client = container_client.get_blob_client(blob_name)
+            content_settings = ContentSettings(content_type="text/markdown; charset=utf-8")
+            await blob_client.upload_blob(data, overwrite=True, content_settings=content_settings)
+            print(f"Uploaded '{blob_name}' to container '{container_name}'.")
+
+    # Keep the local search index in sync with every uploaded artifact
+    await asyncio.to_thread(index_blob_text, blob_name, content)
 
 
 def create_research_summary(
@@ -225,6 +242,141 @@ async def create_consolidated_summary(
     return consolidated_filename, consolidated_content
 
 
+class ProgressReader(io.RawIOBase):
+    """Read-only file stream that prints upload progress as the SDK streams the file.
+
+    Being an io.RawIOBase lets HTTP transports treat it like any other file object
+    (aiohttp only serializes io.IOBase instances, bytes and async iterables).
+    """
+
+    def __init__(self, path: Path, report_every: int = 5 * 1024 * 1024):
+        super().__init__()
+        self._fp = open(path, "rb")
+        self.name = path.name
+        self.total = path.stat().st_size
+        self._report_every = report_every
+        self._next_report = report_every
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        n = self._fp.readinto(buffer)
+        sent = self._fp.tell()
+        if n and (sent >= self._next_report or sent == self.total):
+            print(f"Uploading '{self.name}': {sent}/{self.total} bytes ({sent * 100 // max(self.total, 1)}%)")
+            self._next_report = sent + self._report_every
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        # a retried request rewinds the stream; report progress from the new position
+        position = self._fp.seek(offset, whence)
+        self._next_report = position + self._report_every
+        return position
+
+    def tell(self) -> int:
+        return self._fp.tell()
+
+    def fileno(self) -> int:
+        return self._fp.fileno()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._fp.close()
+        super().close()
+
+
+async def upload_attachments(agents_client: AgentsClient, attachments: List[str]) -> Tuple[List[str], Optional[str]]:
+    """
+    Upload supporting documents to the agents file store and index them in a vector store.
+    Returns (file_ids, vector_store_id); files are streamed from disk with progress output.
+    """
+    file_ids: List[str] = []
+    try:
+        for attachment in attachments:
+            path = Path(attachment)
+            with ProgressReader(path) as reader:
+                print(f"Uploading attachment '{path.name}' ({reader.total} bytes)...")
+                uploaded = await agents_client.files.upload_and_poll(file=reader, filename=path.name, purpose=FilePurpose.AGENTS)
+            print(f"Uploaded attachment '{path.name}', file ID: {uploaded.id}")
+            file_ids.append(uploaded.id)
+
+        if not file_ids:
+            return file_ids, None
+
+        vector_store = await agents_client.vector_stores.create_and_poll(file_ids=file_ids, name="research-attachments")
+    except Exception:
+        # do not leave the files uploaded so far behind when a later upload or the indexing fails
+        await delete_attachments(agents_client, file_ids, None)
+        raise
+    print(f"Created vector store for attachments, ID: {vector_store.id}")
+    return file_ids, vector_store.id
+
+
+async def delete_attachments(agents_client: AgentsClient, file_ids: List[str], vector_store_id: Optional[str]) -> None:
+    """Best-effort removal of the attachment vector store and uploaded files."""
+    if vector_store_id:
+        try:
+            await agents_client.vector_stores.delete(vector_store_id)
+        except Exception as ex:
+            print(f"Failed to delete vector store {vector_store_id}: {ex}")
+    for file_id in file_ids:
+        try:
+            await agents_client.files.delete(file_id)
+        except Exception as ex:
+            print(f"Failed to delete attachment file {file_id}: {ex}")
+
+
+async def collect_run_usage(agents_client: AgentsClient, thread_id: str, run) -> Dict[str, object]:
+    """
+    Collect token usage and tool calls for a finished agent run from the run and its run steps.
+    Token totals come from the run itself; run steps are summed when the run does not report usage.
+    """
+    usage: Dict[str, object] = {
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "total_tokens": 0,
+        "grounded_tool_calls": 0,
+        "tool_calls": {},
+        "run_steps": 0,
+        "run_status": str(run.status),
+        "model": os.getenv("MODEL_DEPLOYMENT_NAME"),
+        "deep_research_model": os.getenv("DEEP_RESEARCH_MODEL_DEPLOYMENT_NAME"),
+    }
+    step_tokens = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+
+    async for step in agents_client.run_steps.list(thread_id=thread_id, run_id=run.id):
+        usage["run_steps"] += 1
+        if step.usage:
+            for field in step_tokens:
+                step_tokens[field] += getattr(step.usage, field, 0) or 0
+        for tool_call in getattr(step.step_details, "tool_calls", None) or []:
+            tool_type = str(getattr(tool_call, "type", "unknown"))
+            usage["tool_calls"][tool_type] = usage["tool_calls"].get(tool_type, 0) + 1
+            # Deep Research and Bing grounding calls are billed against the Bing resource
+            if tool_type in ("deep_research", "bing_grounding"):
+                usage["grounded_tool_calls"] += 1
+
+    run_usage = getattr(run, "usage", None)
+    for field in step_tokens:
+        usage[field] = (getattr(run_usage, field, 0) if run_usage else 0) or step_tokens[field]
+    return usage
+
+
+def write_usage_report(usage: Dict[str, object]) -> None:
+    """Hand the usage report to the web app through the file named by RESEARCH_USAGE_FILE (if set)."""
+    usage_path = os.getenv("RESEARCH_USAGE_FILE")
+    if not usage_path:
+        return
+    try:
+        Path(usage_path).write_text(json.dumps(usage), encoding="utf-8")
+    except Exception as ex:
+        print(f"Failed to write usage report to '{usage_path}': {ex}")
+
+
 def get_default_research_content() -> str:
     """Return the default research content if no custom content is provided."""
     return (
@@ -241,10 +393,11 @@ def get_default_research_content() -> str:
     )
 
 
-async def run_research(research_content: str) -> None:
+async def run_research(research_content: str, attachments: Optional[List[str]] = None) -> None:
     """
     Run the deep research process with the provided research content.
     This function contains the main research logic, separated from argument parsing.
+    Attachments are local file paths made searchable to the agent through a vector store.
     """
     global intermediate_file_counter
     intermediate_file_counter = 0  # Reset counter
@@ -293,119 +446,156 @@ async def run_research(research_content: str) -> None:
             except Exception as ex:
                 print(f"Failed to create placeholder blob: {ex}")
 
-            # Create a new agent that has the Deep Research tool attached.
-            agent = await agents_client.create_agent(
-                model=os.environ["MODEL_DEPLOYMENT_NAME"],
-                name="Agent530",
-                instructions="You are a helpful Agent that assists in researching topics as requested by the user.",
-                tools=deep_research_tool.definitions,
-            )
-            print(f"Created agent, ID: {agent.id}")
-
-            # Create thread for communication
-            thread = await agents_client.threads.create()
-            print(f"Created thread, ID: {thread.id}")
-
-            # Create message to thread
-            message = await agents_client.messages.create(
-                thread_id=thread.id,
-                role="user",
-                content=(
-                    "The Researcher Agent is a deep reasoning AI assistant designed to automate the synthesis of external industry research on IT skills for AI Transformation and internal Microsoft product strategy and marketing insights. Its primary function is to generate insights for the leadership team that highlight key trends in IT Skills and Learning &Development—sourced from organizations like IDC, Forrester, Gartner, Deloitte, and WEF and learning platforms like LinkedIn Learning and Coursera—and contextualize them against Microsoft’s evolving product strategy to strengthen WWL's strategy. Its goal is expose skilling barriers that are preventing our customers from being more successful with our products more quickly. To clarify, I want you to:  "
-                    "1. Provide other reputable resources to provide us with more insights for our research, apart from the ones listed earlier as an example. "
-                    "2. Analyze how different industry sectors - sometimes referred to as verticals - are faring with the demand"
-                    "3. Analyze how these skills align with Microsoft’s current product strategy and marketing initiatives."
-                    "4. Analyze how the Microsoft skilling offering compares to our main competitors such as AWS and Google."
-                    "5. Focusing on the Voice of the Customer, what suggestions would you have for the leadership team to improve our skilling offerings?"
-                    "6. Summarize your findings in a concise report that can be shared with the leadership team. The leadership team is most interested in strategies they should stop, start and continue. "
-                    "7. Provide citations for all sources used in your research, including links to relevant articles, reports, and studies. "
-                    "8. Ensure that your report is well-structured, easy to read, and visually appealing, with appropriate headings, bullet points, and visuals where necessary. "
-                    "don't prompt for any additional information or clarification, just start the research process."
-                ),
-            )
-            print(f"Created message, ID: {message.id}")
-
-            print("Start processing the message... this may take a few minutes to finish. Be patient!")
-            # Poll the run as long as run status is queued or in progress
-            run = await agents_client.runs.create(thread_id=thread.id, agent_id=agent.id)
-            last_message_id: Optional[str] = None
+            # Upload supporting documents (if any) so the agent can search them alongside the web
+            tools = list(deep_research_tool.definitions)
+            tool_resources = None
+            file_ids: List[str] = []
+            vector_store_id: Optional[str] = None
+            try:
+                file_ids, vector_store_id = await upload_attachments(agents_client, attachments or [])
+                if vector_store_id:
+                    file_search_tool = FileSearchTool(vector_store_ids=[vector_store_id])
+                    tools.extend(file_search_tool.definitions)
+                    tool_resources = file_search_tool.resources
+
+                # Create a new agent that has the Deep Research tool attached.
+                agent = await agents_client.create_agent(
+                    model=os.environ["MODEL_DEPLOYMENT_NAME"],
+                    name="Agent530",
+                    instructions="You are a helpful Agent that assists in researching topics as requested by the user.",
+                    tools=tools,
+                    tool_resources=tool_resources,
+                )
+                print(f"Created agent, ID: {agent.id}")
 
-            while run.status in ("queued", "in_progress"):
-                await asyncio.sleep(1)
-                run = await agents_client.runs.get(thread_id=thread.id, run_id=run.id)
+                # Create thread for communication
+                thread = await agents_client.threads.create()
+                print(f"Created thread, ID: {thread.id}")
 
-                previous_last_message_id = last_message_id
-                last_message_id = await fetch_and_save_agent_response(
+                # Create message to thread
+                message = await agents_client.messages.create(
                     thread_id=thread.id,
-                    agents_client=agents_client,
-                    last_message_id=last_message_id,
-                    save_intermediate=True,
-                    container_name=container_name,
-                    blob_folder=run_folder,
-                    intermediate_files=intermediate_files,
+                    role="user",
+                    content=research_content,
                 )
+                print(f"Created message, ID: {message.id}")
 
-                # Print run status
-                print(f"Run status: {run.status}")
+                print("Start processing the message... this may take a few minutes to finish. Be patient!")
+                # Poll the run as long as run status is queued or in progress
+                run = await agents_client.runs.create(thread_id=thread.id, agent_id=agent.id)
+                last_message_id: Optional[str] = None
 
-            print(f"Run finished with status: {run.status}, ID: {run.id}")
+                while run.status in ("queued", "in_progress"):
+                    await asyncio.sleep(1)
+                    run = await agents_client.runs.get(thread_id=thread.id, run_id=run.id)
 
-            if run.status == "failed":
-                print(f"Run failed: {run.last_error}")
+                    previous_last_message_id = last_message_id
+                    last_message_id = await fetch_and_save_agent_response(
+                        thread_id=thread.id,
+                        agents_client=agents_client,
+                        last_message_id=last_message_id,
+                        save_intermediate=True,
+                        container_name=container_name,
+                        blob_folder=run_folder,
+                        intermediate_files=intermediate_files,
+                    )
 
-            # Fetch the final message from the agent in the thread and create a research summary
-            final_message = await agents_client.messages.get_last_message_by_role(
-                thread_id=thread.id, role=MessageRole.AGENT
-            )
-            if final_message:
-                # Create final summary in-memory
-                timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-                final_filename = f"final_research_summary_{timestamp}.md"
-                filename, content = create_research_summary(
-                    final_message,
-                    filename=final_filename,
-                    title="Final Deep Research Summary",
-                    is_intermediate=False,
-                )
+                    # Print run status
+                    print(f"Run status: {run.status}")
+
+                print(f"Run finished with status: {run.status}, ID: {run.id}")
 
-                # If overwrite placeholder was requested, reuse that blob name; otherwise create a timestamped name in run_folder
-                if placeholder_blob_name:
-                    blob_name = f"{run_folder}/{placeholder_blob_name}"
-                else:
-                    base_name = Path(filename).stem if filename else "research_summary"
-                    blob_name = f"{run_folder}/{base_name}_{timestamp}.md"
+                if run.status == "failed":
+                    print(f"Run failed: {run.last_error}")
 
+                # Record model tokens and grounded tool calls used by the run
                 try:
-                    await upload_text_to_blob(content, container_name, blob_name)
+                    usage = await collect_run_usage(agents_client, thread.id, run)
+                    print(
+                        f"Run usage: {usage['total_tokens']} tokens "
+                        f"({usage['prompt_tokens']} prompt, {usage['completion_tokens']} completion), "
+                        f"{usage['grounded_tool_calls']} grounded tool calls over {usage['run_steps']} run steps"
+                    )
+                    write_usage_report(usage)
                 except Exception as ex:
-                    print(f"Failed to upload final summary to Azure Blob Storage: {ex}")
+                    print(f"Failed to collect run usage: {ex}")
+
+                # Fetch the final message from the agent in the thread and create a research summary
+                final_message = await agents_client.messages.get_last_message_by_role(
+                    thread_id=thread.id, role=MessageRole.AGENT
+                )
+                if final_message:
+                    # Create final summary in-memory
+                    timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+                    final_filename = f"final_research_summary_{timestamp}.md"
+                    filename, content = create_research_summary(
+                        final_message,
+                        filename=final_filename,
+                        title="Final Deep Research Summary",
+                        is_intermediate=False,
+                    )
+
+                    # If overwrite placeholder was requested, reuse that blob name; otherwise create a timestamped name in run_folder
+                    if placeholder_blob_name:
+                        blob_name = f"{run_folder}/{placeholder_blob_name}"
+                    else:
+                        base_name = Path(filename).stem if filename else "research_summary"
+                        blob_name = f"{run_folder}/{base_name}_{timestamp}.md"
 
-                # Create consolidated summary and upload if there are intermediate files
-                if intermediate_files:
                     try:
-                        await create_consolidated_summary(intermediate_files, container_name=container_name, blob_folder=run_folder)
+                        await upload_text_to_blob(content, container_name, blob_name)
                     except Exception as ex:
-                        print(f"Failed to create/upload consolidated summary: {ex}")
+                        print(f"Failed to upload final summary to Azure Blob Storage: {ex}")
+
+                    # Create consolidated summary and upload if there are intermediate files
+                    if intermediate_files:
+                        try:
+                            await create_consolidated_summary(intermediate_files, container_name=container_name, blob_folder=run_folder)
+                        except Exception as ex:
+                            print(f"Failed to create/upload consolidated summary: {ex}")
+
+                # Clean-up and delete the agent once the run is finished.
+                # NOTE: Comment out this line if you plan to reuse the agent later.
+                await agents_client.delete_agent(agent.id)
+                print("Deleted agent")
+            finally:
+                # Remove uploaded attachments whether or not the research succeeded
+                await delete_attachments(agents_client, file_ids, vector_store_id)
 
-            # Clean-up and delete the agent once the run is finished.
-            # NOTE: Comment out this line if you plan to reuse the agent later.
-            await agents_client.delete_agent(agent.id)
-            print("Deleted agent")
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Run a Deep Research agent and upload the results to Azure Blob Storage.")
+    parser.add_argument("content", nargs="*", help="research content (prefer --stdin or --prompt-file for long prompts)")
+    parser.add_argument("--stdin", action="store_true", help="read the research content from standard input")
+    parser.add_argument("--prompt-file", help="read the research content from this UTF-8 file")
+    parser.add_argument("--attach", action="append", default=[], help="supporting document to attach (repeatable)")
+    return parser.parse_args()
 
 
 async def main() -> None:
     """Main entry point - handles command line arguments and calls run_research."""
-    research_content = get_default_research_content()
-    
-    # Check if research content was provided as a command line argument
-    if len(sys.argv) > 1:
-        # Join all arguments after the script name as research content
-        research_content = " ".join(sys.argv[1:])
+    args = parse_args()
+
+    # The web app hands the prompt over on stdin: no ARG_MAX limit and not visible in process listings
+    if args.stdin:
+        research_content = sys.stdin.buffer.read().decode("utf-8", errors="replace").strip()
+    elif args.prompt_file:
+        research_content = Path(args.prompt_file).read_text(encoding="utf-8").strip()
+    else:
+        research_content = " ".join(args.content).strip()
+
+    if research_content:
         print(f"Using provided research content: {research_content[:100]}{'...' if len(research_content) > 100 else ''}")
     else:
+        research_content = get_default_research_content()
         print("Using default research content.")
-    
-    await run_research(research_content)
+
+    for attachment in args.attach:
+        if not Path(attachment).is_file():
+            print(f"Attachment not found: {attachment}")
+            sys.exit(2)
+
+    await run_research(research_content, attachments=args.attach)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,343 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from azure.core import MatchConditions
+from azure.core.exceptions import ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from azure.storage.blob import ContentSettings
+
+from run_coordination import get_coordination_container_client
+
+logger = logging.getLogger(__name__)
+
+USAGE_FIELDS = ("prompt_tokens", "completion_tokens", "total_tokens", "grounded_tool_calls")
+# Folder of the per-day usage documents in the coordination container
+USAGE_PREFIX = "usage"
+
+
+def _env_int(name: str, default: int = 0) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float = 0.0) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def estimate_cost(usage: Dict[str, object]) -> float:
+    """Estimated spend for a usage record from USAGE_COST_PER_1K_TOKENS and USAGE_COST_PER_GROUNDED_CALL."""
+    tokens = usage.get("total_tokens") or 0
+    calls = usage.get("grounded_tool_calls") or 0
+    return round(tokens / 1000 * _env_float("USAGE_COST_PER_1K_TOKENS") + calls * _env_float("USAGE_COST_PER_GROUNDED_CALL"), 4)
+
+
+def _add_usage(users: Dict[str, Dict[str, float]], user: str, usage: Dict[str, object]) -> None:
+    totals = users.setdefault(user, {"runs": 0, "estimated_cost": 0.0, **{f: 0 for f in USAGE_FIELDS}})
+    totals["runs"] += 1
+    for field in USAGE_FIELDS:
+        totals[field] += usage.get(field) or 0
+    totals["estimated_cost"] = round(totals["estimated_cost"] + estimate_cost(usage), 4)
+
+
+# (usage total, all-users budget, per-user budget, name used in refusal reasons)
+BUDGETS = (
+    ("total_tokens", "daily_tokens", "user_daily_tokens", "token"),
+    ("grounded_tool_calls", "daily_grounded_calls", "user_daily_grounded_calls", "grounded call"),
+    ("estimated_cost", "daily_cost", "user_daily_cost", "cost"),
+)
+
+
+def _run_estimate(budgets: Dict[str, float]) -> Dict[str, float]:
+    """Usage a run holds in reserve until it reports what it actually used."""
+    estimate = {"total_tokens": budgets["run_token_estimate"], "grounded_tool_calls": budgets["run_grounded_call_estimate"]}
+    estimate["estimated_cost"] = estimate_cost(estimate)
+    return estimate
+
+
+def _over_budget(users: Dict[str, Dict[str, float]], reserved_users: List[str], user: str, budgets: Dict[str, float]) -> Optional[str]:
+    """Reason a new run of user would exceed a budget, given used totals and the users of reserved runs."""
+    estimate = _run_estimate(budgets)
+    for field, daily, user_daily, name in BUDGETS:
+        if budgets[user_daily]:
+            committed = users.get(user, {}).get(field, 0) + reserved_users.count(user) * estimate[field]
+            if committed + estimate[field] > budgets[user_daily]:
+                return f"daily {name} budget of {budgets[user_daily]} for user '{user}' would be exceeded"
+        if budgets[daily]:
+            committed = sum(t.get(field, 0) for t in users.values()) + len(reserved_users) * estimate[field]
+            if committed + estimate[field] > budgets[daily]:
+                return f"daily {name} budget of {budgets[daily]} would be exceeded"
+    return None
+
+
+def _summarize(day: str, users: Dict[str, Dict[str, float]], in_flight: int, budgets: Dict[str, float]) -> Dict[str, object]:
+    totals = {"runs": 0, "estimated_cost": 0.0, **{f: 0 for f in USAGE_FIELDS}}
+    for t in users.values():
+        for key in totals:
+            totals[key] += t.get(key, 0)
+    totals["estimated_cost"] = round(totals["estimated_cost"], 4)
+    return {"day": day, "totals": totals, "users": users, "in_flight_runs": in_flight, "budgets": budgets}
+
+
+class UsageLedger:
+    """Per-run model usage, aggregated per user and per UTC day, with budget-based admission.
+
+    Completed runs are appended to a JSON-lines file (RESEARCH_USAGE_LEDGER_PATH, default
+    <TEMP>/research_usage/ledger.jsonl) and folded into in-memory totals on startup.
+    Runs that were admitted but have not reported usage yet hold a reservation of
+    USAGE_RUN_TOKEN_ESTIMATE tokens and USAGE_RUN_GROUNDED_CALL_ESTIMATE grounded calls
+    (and their estimated cost), so concurrent starts cannot overshoot a budget.
+
+    Budgets (0 = unlimited), each for all users together and for each user:
+    USAGE_DAILY_TOKEN_BUDGET / USAGE_USER_DAILY_TOKEN_BUDGET,
+    USAGE_DAILY_GROUNDED_CALL_BUDGET / USAGE_USER_DAILY_GROUNDED_CALL_BUDGET and
+    USAGE_DAILY_COST_BUDGET / USAGE_USER_DAILY_COST_BUDGET (in estimate_cost() units).
+
+    Totals and reservations live in this process only, so with several instances each one
+    enforces the budgets separately; get_usage_ledger() returns a SharedUsageLedger instead
+    when run coordination is enabled.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else Path(
+            os.getenv("RESEARCH_USAGE_LEDGER_PATH") or Path(os.getenv("TEMP", "/tmp")) / "research_usage" / "ledger.jsonl"
+        )
+        self._lock = threading.Lock()
+        self._totals: Dict[str, Dict[str, Dict[str, float]]] = {}  # day -> user -> totals
+        self._reservations: Dict[str, Dict[str, str]] = {}  # run_id -> {user, day}
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._add(entry["day"], entry["user"], entry.get("usage", {}))
+        except FileNotFoundError:
+            pass
+
+    def _add(self, day: str, user: str, usage: Dict[str, object]) -> None:
+        _add_usage(self._totals.setdefault(day, {}), user, usage)
+
+    @staticmethod
+    def budgets() -> Dict[str, float]:
+        return {
+            "daily_tokens": _env_int("USAGE_DAILY_TOKEN_BUDGET"),
+            "user_daily_tokens": _env_int("USAGE_USER_DAILY_TOKEN_BUDGET"),
+            "daily_grounded_calls": _env_int("USAGE_DAILY_GROUNDED_CALL_BUDGET"),
+            "user_daily_grounded_calls": _env_int("USAGE_USER_DAILY_GROUNDED_CALL_BUDGET"),
+            "daily_cost": _env_float("USAGE_DAILY_COST_BUDGET"),
+            "user_daily_cost": _env_float("USAGE_USER_DAILY_COST_BUDGET"),
+            "run_token_estimate": _env_int("USAGE_RUN_TOKEN_ESTIMATE", 500000),
+            "run_grounded_call_estimate": _env_int("USAGE_RUN_GROUNDED_CALL_ESTIMATE", 30),
+        }
+
+    def try_admit(self, run_id: str, user: str) -> Optional[str]:
+        """Reserve budget for a new run. Returns None if admitted, otherwise the reason it was not."""
+        budgets = self.budgets()
+        day = today()
+        with self._lock:
+            if run_id in self._reservations:
+                return None
+            reserved_users = [r["user"] for r in self._reservations.values() if r["day"] == day]
+            reason = _over_budget(self._totals.get(day, {}), reserved_users, user, budgets)
+            if reason:
+                return reason
+            self._reservations[run_id] = {"user": user, "day": day}
+        return None
+
+    def release(self, run_id: str) -> None:
+        """Drop a reservation without recording usage (e.g. the run never reached the model)."""
+        with self._lock:
+            self._reservations.pop(run_id, None)
+
+    def record(self, run_id: str, user: str, usage: Dict[str, object]) -> None:
+        """Record a finished run's usage against the day it was admitted and release its reservation."""
+        with self._lock:
+            reservation = self._reservations.pop(run_id, None)
+            day = reservation["day"] if reservation else today()
+            self._add(day, user, usage)
+            self._append_entry(run_id, user, day, usage)
+
+    def _append_entry(self, run_id: str, user: str, day: str, usage: Dict[str, object]) -> None:
+        entry = {"run_id": run_id, "user": user, "day": day, "recorded": datetime.now(timezone.utc).isoformat(), "usage": usage}
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+        except OSError as ex:
+            logger.warning(f"Failed to append to usage ledger {self.path}: {ex}")
+
+    def summary(self, day: Optional[str] = None, user: Optional[str] = None) -> Dict[str, object]:
+        day = day or today()
+        with self._lock:
+            users = {u: dict(t) for u, t in self._totals.get(day, {}).items() if user is None or u == user}
+            in_flight = sum(1 for r in self._reservations.values() if r["day"] == day and (user is None or r["user"] == user))
+        return _summarize(day, users, in_flight, self.budgets())
+
+
+class SharedUsageLedger(UsageLedger):
+    """Usage ledger whose daily totals and reservations are shared by all app instances.
+
+    Each UTC day is one JSON document (usage/<day>.json) in the run coordination container,
+    holding per-user totals and the reservations of admitted runs. Every change is a
+    read-modify-write guarded by the blob's ETag and retried when another instance wrote
+    in between, so concurrent admissions on different instances cannot overshoot a budget.
+    Reservations of runs that never report back (their instance died) expire after
+    USAGE_RESERVATION_HOURS (default 24). The local JSON-lines file is still appended to
+    as this instance's record of the runs it executed.
+    """
+
+    MAX_ATTEMPTS = 10
+
+    def __init__(self, container_client, path: Optional[Path] = None):
+        self.container_client = container_client
+        self._container_ready = False
+        super().__init__(path)
+
+    def _load(self) -> None:
+        # totals come from the shared documents, not the local file
+        pass
+
+    def _day_client(self, day: str):
+        return self.container_client.get_blob_client(f"{USAGE_PREFIX}/{day}.json")
+
+    def _read_day(self, day: str):
+        """Return (document, etag) for a day; etag is None when the document does not exist yet."""
+        try:
+            downloader = self._day_client(day).download_blob()
+            return json.loads(downloader.readall()), downloader.properties.etag
+        except ResourceNotFoundError:
+            return {"users": {}, "reservations": {}}, None
+
+    def _update_day(self, day: str, change: Callable[[Dict[str, object]], object]):
+        """Apply change to the day's document and write it back if the blob did not change meanwhile.
+
+        change mutates the document in place and returns a result; a result that is not None
+        means nothing should be written (e.g. admission was refused).
+        """
+        if not self._container_ready:
+            try:
+                self.container_client.create_container()
+            except ResourceExistsError:
+                pass
+            self._container_ready = True
+        reservation_seconds = _env_int("USAGE_RESERVATION_HOURS", 24) * 3600
+        for _ in range(self.MAX_ATTEMPTS):
+            doc, etag = self._read_day(day)
+            now = datetime.now(timezone.utc)
+            doc["reservations"] = {
+                run_id: r for run_id, r in doc.get("reservations", {}).items()
+                if (now - datetime.fromisoformat(r["reserved"])).total_seconds() < reservation_seconds
+            }
+            result = change(doc)
+            if result is not None:
+                return result
+            data = json.dumps(doc).encode("utf-8")
+            settings = ContentSettings(content_type="application/json")
+            try:
+                if etag is None:
+                    self._day_client(day).upload_blob(data, overwrite=False, content_settings=settings)
+                else:
+                    self._day_client(day).upload_blob(data, overwrite=True, etag=etag, match_condition=MatchConditions.IfNotModified, content_settings=settings)
+                return None
+            except (ResourceModifiedError, ResourceExistsError):
+                continue  # another instance updated the day first; re-read and re-apply
+        raise RuntimeError(f"usage ledger for {day} is too contended to update")
+
+    def try_admit(self, run_id: str, user: str) -> Optional[str]:
+        budgets = self.budgets()
+        day = today()
+        with self._lock:
+            if run_id in self._reservations:
+                return None
+
+        def admit(doc):
+            reservations = doc["reservations"]
+            if run_id in reservations:
+                return None  # e.g. a run taken over from another instance
+            reason = _over_budget(doc.get("users", {}), [r["user"] for r in reservations.values()], user, budgets)
+            if reason:
+                return reason
+            reservations[run_id] = {"user": user, "reserved": datetime.now(timezone.utc).isoformat()}
+            return None
+
+        reason = self._update_day(day, admit)
+        if reason is None:
+            with self._lock:
+                self._reservations[run_id] = {"user": user, "day": day}
+        return reason
+
+    def release(self, run_id: str) -> None:
+        with self._lock:
+            reservation = self._reservations.pop(run_id, None)
+        if not reservation:
+            return
+
+        def drop(doc):
+            doc["reservations"].pop(run_id, None)
+            return None
+
+        self._update_day(reservation["day"], drop)
+
+    def record(self, run_id: str, user: str, usage: Dict[str, object]) -> None:
+        with self._lock:
+            reservation = self._reservations.pop(run_id, None)
+        day = reservation["day"] if reservation else today()
+
+        def add(doc):
+            doc["reservations"].pop(run_id, None)
+            _add_usage(doc.setdefault("users", {}), user, usage)
+            return None
+
+        self._update_day(day, add)
+        with self._lock:
+            self._append_entry(run_id, user, day, usage)
+
+    def summary(self, day: Optional[str] = None, user: Optional[str] = None) -> Dict[str, object]:
+        day = day or today()
+        doc, _ = self._read_day(day)
+        users = {u: t for u, t in doc.get("users", {}).items() if user is None or u == user}
+        in_flight = sum(1 for r in doc.get("reservations", {}).values() if user is None or r["user"] == user)
+        return _summarize(day, users, in_flight, self.budgets())
+
+
+def read_usage_file(path: Path) -> Optional[Dict[str, object]]:
+    """Load the usage report the researcher script writes to RESEARCH_USAGE_FILE, if any."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def admission_mode() -> str:
+    """USAGE_ADMISSION_MODE: 'reject' (default) refuses over-budget runs, 'queue' holds them until budget frees up."""
+    return "queue" if os.getenv("USAGE_ADMISSION_MODE", "reject").lower() == "queue" else "reject"
+
+
+_default_ledger: Optional[UsageLedger] = None
+_default_ledger_lock = threading.Lock()
+
+
+def get_usage_ledger() -> UsageLedger:
+    global _default_ledger
+    with _default_ledger_lock:
+        if _default_ledger is None:
+            container_client = get_coordination_container_client()
+            _default_ledger = SharedUsageLedger(container_client) if container_client is not None else UsageLedger()
+        return _default_ledger
@@ -0,0 +1,208 @@
+"""In-memory stand-in for the sync blob container client used by run coordination and usage accounting.
+
+Models what those modules rely on: create-only and ETag-conditional uploads, blob
+leases that expire on a test clock, append blobs, metadata and listings with lease
+status. Errors carry the status codes and error codes the storage service returns.
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from azure.core import MatchConditions
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+
+
+def make_error(status_code: int, error_code: str, error_type=HttpResponseError):
+    ex = error_type(message=f"{status_code} {error_code}")
+    ex.status_code = status_code
+    ex.error_code = error_code
+    return ex
+
+
+class FakeClock:
+    """Wall clock that tests can move forward; patch() makes modules read it via datetime.now()."""
+
+    def __init__(self):
+        self.offset = timedelta()
+
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc) + self.offset
+
+    def advance(self, seconds: float) -> None:
+        self.offset += timedelta(seconds=seconds)
+
+    def patch(self, monkeypatch, *modules) -> None:
+        clock = self
+
+        class _Datetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return clock.now().astimezone(tz) if tz else clock.now().replace(tzinfo=None)
+
+        for module in modules:
+            monkeypatch.setattr(module, "datetime", _Datetime)
+
+
+class _Blob:
+    def __init__(self, clock: FakeClock, data: bytes, metadata=None):
+        self.clock = clock
+        self.data = bytearray(data)
+        self.metadata = dict(metadata or {})
+        self.lease_id = None
+        self.lease_expires = None
+        self.touch()
+
+    def touch(self) -> None:
+        self.etag = f'"{uuid.uuid4().hex}"'
+        self.last_modified = self.clock.now()
+
+    def leased(self) -> bool:
+        return self.lease_id is not None and self.lease_expires > self.clock.now()
+
+
+class FakeLease:
+    def __init__(self, blob_client: "FakeBlobClient", lease_id: str, duration: int):
+        self.blob_client = blob_client
+        self.id = lease_id
+        self.duration = duration
+
+    def _own_blob(self) -> _Blob:
+        blob = self.blob_client._blob()
+        # an expired lease can still be renewed until someone else acquires the blob
+        if blob.lease_id != self.id:
+            raise make_error(409, "LeaseIdMismatchWithLeaseOperation")
+        return blob
+
+    def renew(self) -> None:
+        self.blob_client.container._maybe_fail("renew")
+        self._own_blob().lease_expires = self.blob_client.container.clock.now() + timedelta(seconds=self.duration)
+
+    def release(self) -> None:
+        blob = self._own_blob()
+        blob.lease_id = blob.lease_expires = None
+
+
+class FakeBlobClient:
+    def __init__(self, container: "FakeContainerClient", blob_name: str):
+        self.container = container
+        self.blob_name = blob_name
+
+    def _blob(self) -> _Blob:
+        blob = self.container.blobs.get(self.blob_name)
+        if blob is None:
+            raise make_error(404, "BlobNotFound", ResourceNotFoundError)
+        return blob
+
+    @staticmethod
+    def _check_lease(blob: _Blob, lease) -> None:
+        lease_id = getattr(lease, "id", lease)
+        if blob.leased():
+            if lease_id is None:
+                raise make_error(412, "LeaseIdMissing")
+            if lease_id != blob.lease_id:
+                raise make_error(412, "LeaseIdMismatchWithBlobOperation")
+        elif lease_id is not None:
+            raise make_error(412, "LeaseNotPresentWithBlobOperation")
+
+    def upload_blob(self, data, overwrite=False, lease=None, metadata=None, etag=None, match_condition=None, **kwargs):
+        self.container._before_write(self.blob_name)
+        self.container._maybe_fail("upload_blob")
+        existing = self.container.blobs.get(self.blob_name)
+        conditional = etag is not None and match_condition == MatchConditions.IfNotModified
+        if existing is None:
+            if conditional:
+                raise make_error(412, "ConditionNotMet", ResourceModifiedError)
+        else:
+            if not overwrite:
+                raise make_error(409, "BlobAlreadyExists", ResourceExistsError)
+            if conditional and etag != existing.etag:
+                raise make_error(412, "ConditionNotMet", ResourceModifiedError)
+            self._check_lease(existing, lease)
+        blob = _Blob(self.container.clock, data, metadata)
+        if existing is not None:
+            # overwriting keeps the blob's lease
+            blob.lease_id, blob.lease_expires = existing.lease_id, existing.lease_expires
+        self.container.blobs[self.blob_name] = blob
+
+    def create_append_blob(self, **kwargs) -> None:
+        self.container._maybe_fail("create_append_blob")
+        self.container.blobs[self.blob_name] = _Blob(self.container.clock, b"")
+
+    def append_block(self, data) -> None:
+        blob = self._blob()
+        blob.data.extend(data)
+        blob.touch()
+
+    def download_blob(self, lease=None, offset=None, length=None):
+        self.container.downloads += 1
+        blob = self._blob()
+        if lease is not None:
+            self._check_lease(blob, lease)
+        start = offset or 0
+        data = bytes(blob.data[start:start + length] if length is not None else blob.data[start:])
+        return SimpleNamespace(readall=lambda: data, properties=SimpleNamespace(etag=blob.etag))
+
+    def get_blob_properties(self):
+        blob = self._blob()
+        return SimpleNamespace(size=len(blob.data), etag=blob.etag, last_modified=blob.last_modified, metadata=dict(blob.metadata))
+
+    def acquire_lease(self, lease_duration=-1) -> FakeLease:
+        self.container._maybe_fail("acquire_lease")
+        blob = self._blob()
+        if blob.leased():
+            raise make_error(409, "LeaseAlreadyPresent")
+        blob.lease_id = str(uuid.uuid4())
+        blob.lease_expires = self.container.clock.now() + timedelta(seconds=lease_duration)
+        return FakeLease(self, blob.lease_id, lease_duration)
+
+    def delete_blob(self, lease=None) -> None:
+        self._check_lease(self._blob(), lease)
+        del self.container.blobs[self.blob_name]
+
+
+class FakeContainerClient:
+    """Container of in-memory blobs.
+
+    fail maps an operation name to an exception raised by its next call; before_write, if
+    set, is called once with the blob name just before the next upload (to interleave a
+    write by another instance).
+    """
+
+    def __init__(self, clock: FakeClock = None):
+        self.clock = clock or FakeClock()
+        self.blobs = {}
+        self.created = False
+        self.downloads = 0
+        self.fail = {}
+        self.before_write = None
+
+    def _maybe_fail(self, operation: str) -> None:
+        ex = self.fail.pop(operation, None)
+        if ex is not None:
+            raise ex
+
+    def _before_write(self, blob_name: str) -> None:
+        hook, self.before_write = self.before_write, None
+        if hook:
+            hook(blob_name)
+
+    def create_container(self) -> None:
+        if self.created:
+            raise make_error(409, "ContainerAlreadyExists", ResourceExistsError)
+        self.created = True
+
+    def get_blob_client(self, blob_name: str) -> FakeBlobClient:
+        return FakeBlobClient(self, blob_name)
+
+    def list_blobs(self, name_starts_with: str = "", include=None):
+        return [
+            SimpleNamespace(
+                name=name,
+                size=len(blob.data),
+                metadata=dict(blob.metadata) if include and "metadata" in include else {},
+                last_modified=blob.last_modified,
+                lease=SimpleNamespace(status="locked" if blob.leased() else "unlocked"),
+            )
+            for name, blob in sorted(self.blobs.items())
+            if name.startswith(name_starts_with)
+        ]
@@ -0,0 +1,120 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+pytest.importorskip("azure.core")
+pytest.importorskip("azure.ai.agents")
+pytest.importorskip("azure.ai.projects")
+pytest.importorskip("dotenv")
+
+from azure.core.pipeline.transport import AioHttpTransport  # noqa: E402
+from azure.core.rest import HttpRequest  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from split_deepresearcher_to_blob import ProgressReader, upload_attachments  # noqa: E402
+
+
+class _CollectingWriter:
+    def __init__(self):
+        self.data = bytearray()
+
+    async def write(self, chunk):
+        self.data.extend(chunk)
+
+    async def write_eof(self, chunk=b""):
+        self.data.extend(chunk)
+
+    async def drain(self):
+        pass
+
+
+def test_progress_reader_builds_aiohttp_multipart_body(tmp_path, capsys):
+    content = bytes(range(256)) * 1024  # 256 KiB
+    path = tmp_path / "notes.pdf"
+    path.write_bytes(content)
+
+    async def build_body():
+        with ProgressReader(path, report_every=64 * 1024) as reader:
+            # the same request shape the agents SDK builds for files.upload(file=..., purpose=..., filename=...)
+            request = HttpRequest(
+                "POST",
+                "https://example.invalid/files",
+                files=[("file", reader)],
+                data={"purpose": "assistants", "filename": path.name},
+            )
+            form = AioHttpTransport()._get_request_data(request)
+            payload = form()
+            writer = _CollectingWriter()
+            await payload.write(writer)
+            return bytes(writer.data)
+
+    body = asyncio.run(build_body())
+
+    assert content in body
+    assert b'filename="notes.pdf"' in body
+    assert b'name="purpose"' in body
+    assert "262144/262144 bytes (100%)" in capsys.readouterr().out
+
+
+def test_progress_reader_rewinds_for_retries(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes(b"abcdef")
+    with ProgressReader(path) as reader:
+        assert reader.read() == b"abcdef"
+        reader.seek(0)
+        assert reader.read(3) == b"abc"
+    assert reader.closed
+
+
+class _FakeFiles:
+    def __init__(self, fail_on: int):
+        self.fail_on = fail_on
+        self.uploaded = []
+        self.deleted = []
+
+    async def upload_and_poll(self, file, filename, purpose):
+        if len(self.uploaded) == self.fail_on:
+            raise RuntimeError("upload failed")
+        file.read()
+        file_id = f"file-{len(self.uploaded)}"
+        self.uploaded.append(file_id)
+        return type("FileInfo", (), {"id": file_id})()
+
+    async def delete(self, file_id):
+        self.deleted.append(file_id)
+
+
+class _FakeVectorStores:
+    def __init__(self, fail: bool):
+        self.fail = fail
+
+    async def create_and_poll(self, file_ids, name):
+        if self.fail:
+            raise RuntimeError("indexing failed")
+        return type("VectorStore", (), {"id": "vs-1"})()
+
+
+class _FakeAgentsClient:
+    def __init__(self, fail_upload_on: int = -1, fail_vector_store: bool = False):
+        self.files = _FakeFiles(fail_upload_on)
+        self.vector_stores = _FakeVectorStores(fail_vector_store)
+
+
+@pytest.mark.parametrize("client_kwargs", [{"fail_upload_on": 2}, {"fail_vector_store": True}])
+def test_upload_attachments_deletes_uploaded_files_on_failure(tmp_path, client_kwargs):
+    paths = []
+    for i in range(3):
+        path = tmp_path / f"doc{i}.txt"
+        path.write_text(f"document {i}")
+        paths.append(str(path))
+    client = _FakeAgentsClient(**client_kwargs)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(upload_attachments(client, paths))
+
+    assert client.files.uploaded
+    assert client.files.deleted == client.files.uploaded
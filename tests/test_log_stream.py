@@ -0,0 +1,70 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("quart")
+pytest.importorskip("aiohttp")
+pytest.importorskip("azure.storage.blob")
+pytest.importorskip("markdown")
+pytest.importorskip("nh3")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import asgi_app  # noqa: E402
+from asgi_app import LOG_STREAM_READ_BYTES, _sendable_length, _utf8_boundary  # noqa: E402
+
+
+def _parse_events(body: str):
+    """(id, data) of every data event and the payload of the end event."""
+    events, end = [], None
+    for block in body.split("\n\n"):
+        fields = [line.split(": ", 1) if ": " in line else [line.rstrip(":"), ""] for line in block.split("\n") if line]
+        if not fields or fields[0][0] == "":
+            continue
+        if fields[0] == ["event", "end"]:
+            end = fields[1][1]
+            continue
+        event_id = int(fields[0][1])
+        events.append((event_id, "\n".join(value for name, value in fields[1:] if name == "data")))
+    return events, end
+
+
+def _stream(run_id: str, offset: int = 0) -> str:
+    async def fetch():
+        client = asgi_app.app.test_client()
+        response = await client.get(f"/log/stream?run_id={run_id}&offset={offset}")
+        return (await response.get_data()).decode("utf-8")
+
+    return asyncio.run(fetch())
+
+
+@pytest.mark.parametrize("log", [
+    b"x" * (LOG_STREAM_READ_BYTES - 1) + "é—done\n".encode("utf-8"),
+    b"x" * (LOG_STREAM_READ_BYTES - 2) + "\n€ tail without newline".encode("utf-8"),
+    ("line ✓\n" * 20000).encode("utf-8"),
+])
+def test_stream_never_splits_characters(tmp_path, monkeypatch, log):
+    path = tmp_path / "run.log"
+    path.write_bytes(log)
+    monkeypatch.setitem(asgi_app.runs, "run-1", {"log": str(path), "status": "completed"})
+
+    events, end = _parse_events(_stream("run-1"))
+
+    assert end == "completed"
+    assert "".join(data for _, data in events) == log.decode("utf-8")
+    # ids are byte offsets a reconnect can resume from
+    assert events[-1][0] == len(log)
+    resumed, _ = _parse_events(_stream("run-1", offset=events[0][0]))
+    assert "".join(data for _, data in resumed) == log[events[0][0]:].decode("utf-8")
+
+
+def test_sendable_length_holds_back_partial_lines_and_characters():
+    euro = "€".encode("utf-8")
+    assert _sendable_length(b"done\npartial", final=False) == 5
+    assert _sendable_length(b"partial", final=False) == 0
+    assert _sendable_length(b"partial" + euro[:2], final=True) == 7
+    assert _utf8_boundary(b"ab" + euro) == 5
+    assert _utf8_boundary(b"ab" + euro[:1]) == 2
+    assert _utf8_boundary("é".encode("utf-8")) == 2
@@ -0,0 +1,159 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("azure.core")
+pytest.importorskip("azure.storage.blob")
+
+from azure.core.exceptions import HttpResponseError, ResourceExistsError, ServiceRequestError  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import run_coordination  # noqa: E402
+from fake_blob_storage import FakeClock, FakeContainerClient, make_error  # noqa: E402
+from run_coordination import CREATING_STATUS, RunCoordinator  # noqa: E402
+
+LEASE_SECONDS = 60
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    clock.patch(monkeypatch, run_coordination)
+    return clock
+
+
+@pytest.fixture
+def container(clock):
+    return FakeContainerClient(clock)
+
+
+def _coordinator(container, instance_id: str) -> RunCoordinator:
+    return RunCoordinator(container, instance_id=instance_id, lease_seconds=LEASE_SECONDS, retention_hours=48)
+
+
+def _listing(container):
+    return {blob.name: blob for blob in container.list_blobs(include=["metadata"])}
+
+
+def test_create_run_publishes_leased_record_and_log(container):
+    ownership = _coordinator(container, "a").create_run("r1", {"status": "running", "user": "alice"})
+
+    blobs = _listing(container)
+    assert blobs["runs/r1.json"].lease.status == "locked"
+    assert blobs["runs/r1.json"].metadata["status"] == "running"
+    assert "runs/r1.log" in blobs
+    record = _coordinator(container, "b").get_run("r1")
+    assert (record["owner"], record["attempt"], record["user"]) == ("a", 1, "alice")
+    assert ownership.heartbeat(status="running")
+
+
+def test_create_run_refuses_a_run_id_that_exists(container):
+    _coordinator(container, "a").create_run("r1", {"status": "running"})
+
+    with pytest.raises(ResourceExistsError):
+        _coordinator(container, "b").create_run("r1", {"status": "running"})
+    assert _coordinator(container, "b").get_run("r1")["owner"] == "a"
+
+
+@pytest.mark.parametrize("operation", ["acquire_lease", "create_append_blob", "upload_blob"])
+def test_failed_create_run_leaves_nothing_behind(container, operation):
+    coordinator = _coordinator(container, "a")
+    coordinator.create_run("warmup", {"status": "running"})  # creates the container first
+    before = set(container.blobs)
+    if operation == "upload_blob":
+        def fail_record_write(name):
+            raise make_error(503, "ServerBusy")
+
+        # the placeholder upload succeeds, writing the full record fails
+        container.before_write = lambda name: setattr(container, "before_write", fail_record_write)
+    else:
+        container.fail[operation] = make_error(503, "ServerBusy")
+
+    with pytest.raises(HttpResponseError):
+        coordinator.create_run("r1", {"status": "running"})
+    assert set(container.blobs) == before
+
+
+def test_heartbeat_reports_lost_ownership_on_lease_conflict(container, clock):
+    ownership = _coordinator(container, "a").create_run("r1", {"status": "running"})
+    clock.advance(LEASE_SECONDS + 1)
+    taken = _coordinator(container, "b").take_over_stale_runs()
+
+    assert [t.run_id for t in taken] == ["r1"]
+    # a conflict means the run is gone even if the last successful renewal was recent
+    ownership.renewed_at = clock.now()
+    assert not ownership.heartbeat(status="running")
+    assert ownership.lost
+    ownership.finish(status="completed")  # a lost owner must not touch the record anymore
+    record = _coordinator(container, "c").get_run("r1")
+    assert (record["owner"], record["attempt"], record["status"]) == ("b", 2, "queued")
+
+
+def test_heartbeat_retries_transient_failures_until_the_lease_expires(container, clock):
+    ownership = _coordinator(container, "a").create_run("r1", {"status": "running"})
+
+    container.fail["renew"] = ServiceRequestError("connection reset")
+    clock.advance(LEASE_SECONDS / 2)
+    assert ownership.heartbeat()
+    assert not ownership.lost
+
+    container.fail["renew"] = ServiceRequestError("connection reset")
+    clock.advance(LEASE_SECONDS / 2 + 1)
+    assert not ownership.heartbeat()
+    assert ownership.lost
+
+
+def test_live_runs_are_not_taken_over(container, clock):
+    ownership = _coordinator(container, "a").create_run("r1", {"status": "running"})
+    for _ in range(3):
+        clock.advance(LEASE_SECONDS / 2)
+        assert ownership.heartbeat(status="running")
+        assert _coordinator(container, "b").take_over_stale_runs() == []
+
+
+def test_only_one_instance_takes_over_a_stale_run(container, clock, monkeypatch):
+    _coordinator(container, "dead").create_run("r1", {"status": "running"})
+    clock.advance(LEASE_SECONDS + 1)
+    # both sweepers list the run while it is still unleased
+    stale_listing = container.list_blobs(name_starts_with="runs/", include=["metadata"])
+
+    first = _coordinator(container, "b").take_over_stale_runs()
+    monkeypatch.setattr(container, "list_blobs", lambda **kwargs: stale_listing)
+    second = _coordinator(container, "c").take_over_stale_runs()
+
+    assert [t.run_id for t in first] == ["r1"]
+    assert second == []
+    assert _coordinator(container, "d").get_run("r1")["owner"] == "b"
+
+
+def test_sweep_discards_placeholders_of_runs_never_created(container, clock):
+    coordinator = _coordinator(container, "b")
+    coordinator.create_run("warmup", {"status": "running"}).finish(status="completed")
+    # an instance died between uploading the placeholder and acquiring its lease
+    container.get_blob_client("runs/r1.json").upload_blob(b"", metadata={"status": CREATING_STATUS})
+    assert coordinator.get_run("r1") is None
+
+    assert coordinator.take_over_stale_runs() == []
+    assert "runs/r1.json" in container.blobs
+
+    clock.advance(LEASE_SECONDS + 1)
+    coordinator.take_over_stale_runs()
+    assert "runs/r1.json" not in container.blobs
+
+
+def test_sweep_deletes_finished_records_after_retention_without_downloading(container, clock):
+    coordinator = _coordinator(container, "a")
+    coordinator.create_run("r1", {"status": "running"}).finish(status="completed")
+    container.get_blob_client("runs/orphan.log").create_append_blob()
+    container.downloads = 0
+
+    clock.advance(3600)
+    assert coordinator.take_over_stale_runs() == []
+    assert set(container.blobs) == {"runs/r1.json", "runs/r1.log", "runs/orphan.log"}
+
+    clock.advance(48 * 3600)
+    coordinator.take_over_stale_runs()
+    assert container.blobs == {}
+    assert container.downloads == 0
@@ -0,0 +1,98 @@
+import json
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("azure.core")
+pytest.importorskip("azure.storage.blob")
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from fake_blob_storage import FakeContainerClient  # noqa: E402
+from usage_accounting import SharedUsageLedger, UsageLedger, today  # noqa: E402
+
+
+@pytest.fixture
+def container(monkeypatch):
+    monkeypatch.setenv("USAGE_DAILY_TOKEN_BUDGET", "1000")
+    monkeypatch.setenv("USAGE_RUN_TOKEN_ESTIMATE", "600")
+    monkeypatch.delenv("USAGE_USER_DAILY_TOKEN_BUDGET", raising=False)
+    return FakeContainerClient()
+
+
+def _ledger(container, tmp_path, name: str) -> SharedUsageLedger:
+    return SharedUsageLedger(container, tmp_path / f"{name}.jsonl")
+
+
+def _reservations(container):
+    return json.loads(container.blobs[f"usage/{today()}.json"].data)["reservations"]
+
+
+def test_instances_share_one_budget(container, tmp_path):
+    a, b = _ledger(container, tmp_path, "a"), _ledger(container, tmp_path, "b")
+
+    assert a.try_admit("r1", "alice") is None
+    assert "daily token budget of 1000" in b.try_admit("r2", "bob")
+
+    a.record("r1", "alice", {"total_tokens": 100})
+    assert b.try_admit("r2", "bob") is None
+    assert b.summary()["totals"]["total_tokens"] == 100
+    assert b.summary()["in_flight_runs"] == 1
+
+
+@pytest.mark.parametrize("existing_day", [False, True])
+def test_concurrent_admission_is_retried_against_the_new_document(container, tmp_path, existing_day):
+    a, b = _ledger(container, tmp_path, "a"), _ledger(container, tmp_path, "b")
+    if existing_day:
+        # the day document exists, so writes are guarded by its ETag rather than create-only
+        a.record("r0", "alice", {"total_tokens": 0})
+    # b admits a run between a reading the day and writing it back
+    container.before_write = lambda name: b.try_admit("r2", "bob")
+
+    reason = a.try_admit("r1", "alice")
+
+    assert "daily token budget" in reason
+    assert list(_reservations(container)) == ["r2"]
+
+
+def test_admission_gives_up_when_the_day_keeps_changing(container, tmp_path):
+    ledger = _ledger(container, tmp_path, "a")
+    ledger.record("r0", "alice", {"total_tokens": 0})
+    day_client = container.get_blob_client(f"usage/{today()}.json")
+
+    def interfere(name):
+        day_client.upload_blob(bytes(container.blobs[name].data), overwrite=True)
+        container.before_write = interfere
+
+    container.before_write = interfere
+    with pytest.raises(RuntimeError, match="too contended"):
+        ledger.try_admit("r1", "alice")
+    container.before_write = None
+    assert _reservations(container) == {}
+
+
+@pytest.mark.parametrize("env, usage, reason", [
+    (
+        {"USAGE_USER_DAILY_GROUNDED_CALL_BUDGET": "50"},
+        {"total_tokens": 1000, "grounded_tool_calls": 30},
+        "daily grounded call budget of 50 for user 'alice' would be exceeded",
+    ),
+    (
+        {"USAGE_DAILY_COST_BUDGET": "12", "USAGE_COST_PER_1K_TOKENS": "0.01", "USAGE_COST_PER_GROUNDED_CALL": "0.1"},
+        # 5.0 for the tokens plus 1.0 for the calls; the next run is estimated at 5.0 + 3.0
+        {"total_tokens": 500000, "grounded_tool_calls": 10},
+        "daily cost budget of 12.0 would be exceeded",
+    ),
+])
+def test_grounded_call_and_cost_budgets(tmp_path, monkeypatch, env, usage, reason):
+    for name in ("USAGE_DAILY_TOKEN_BUDGET", "USAGE_USER_DAILY_TOKEN_BUDGET", "USAGE_RUN_TOKEN_ESTIMATE", "USAGE_RUN_GROUNDED_CALL_ESTIMATE"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    ledger = UsageLedger(tmp_path / "ledger.jsonl")
+
+    assert ledger.try_admit("r1", "alice") is None
+    ledger.record("r1", "alice", usage)
+
+    assert ledger.try_admit("r2", "alice") == reason